@@ -0,0 +1,55 @@
+"""Бенчмарк рассылки: последовательная отправка против broadcast.broadcast.
+
+Обе версии шлют сообщения в локальную заглушку Bot API с задержкой ответа.
+Заглушка отвечает 429, если бот превышает ее лимит.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_broadcast.py [--users 300] [--latency 0.1] [--rate-limit 30]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telebot  # noqa: E402
+import broadcast  # noqa: E402
+from fake_bot_api import FakeBotApi  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--rate-limit", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=broadcast.BROADCAST_WORKERS)
+    args = parser.parse_args()
+
+    api = FakeBotApi(latency=args.latency, rate_limit=args.rate_limit).start()
+    telebot.apihelper.API_URL = api.api_url
+    bot = telebot.TeleBot("123456:bench", threaded=False)
+    user_ids = list(range(1000, 1000 + args.users))
+
+    started = time.monotonic()
+    failed = 0
+    for user_id in user_ids:
+        try:
+            bot.send_message(user_id, "Kind Reminder")
+        except Exception:
+            failed += 1
+    sequential = time.monotonic() - started
+    print(f"Последовательно: {sequential:.1f} с, ошибок {failed}, 429 от API: {api.rejected['sendMessage']}")
+
+    api.rejected.clear()
+    summary = broadcast.broadcast(
+        bot, ((user_id, "Kind Reminder") for user_id in user_ids),
+        workers=args.workers, rate=min(broadcast.BROADCAST_RATE, args.rate_limit)
+    )
+    print(f"broadcast: {summary['duration']:.1f} с, ошибок {summary['failed']}, "
+          f"повторов {summary['retried']}, 429 от API: {api.rejected['sendMessage']}")
+    api.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Бенчмарк диспетчеризации callback-запросов.
+
+Сравнивает прежнюю цепочку if/elif со startswith() и CallbackRouter на одном
+потоке нажатий. Поток читается из файла (по строке callback_data в прежнем
+формате) или генерируется с долями, типичными для просмотра отчетов.
+Обработчики пустые, поэтому измеряется только стоимость выбора маршрута
+и разбора аргументов. Стоимость цепочки растет с позицией ветки,
+а у маршрутизатора одинакова для всех действий.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_callback_dispatch.py [--calls 200000] [--stream callbacks.txt]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import callbacks  # noqa: E402
+
+# Прежний формат callback_data -> (действие, аргументы) для перевода потока в новый кодек
+LEGACY = [
+    ("myreport_", "my_report"),
+    ("edit_", "edit_report"),
+    ("delete_", "delete_report"),
+    ("user_", "user_dates"),
+    ("report_", "report"),
+    ("edittask_", "edit_task"),
+    ("toggletask_", "toggle_task"),
+    ("deletetask_", "delete_task"),
+    ("mytask_", "my_task"),
+]
+LEGACY_EXACT = {"back_to_myreports": "my_reports", "back_to_users": "users", "back_to_mytasks": "my_tasks"}
+
+
+def handler(call, *args):
+    pass
+
+
+def legacy_dispatch(call):
+    """Прежняя схема: telebot перебирает фильтры зарегистрированных обработчиков
+    (handle_edit_report, затем catch-all), а дальше идет цепочка из handle_inline_buttons"""
+    for check, target in LEGACY_HANDLERS:
+        if check(call):
+            target(call)
+            return
+
+
+def _legacy_inline_buttons(call):
+    handler(call, _legacy_args(call.data))
+
+
+LEGACY_HANDLERS = [
+    (lambda call: call.data.startswith("edit_"), lambda call: handler(call, call.data.split("_")[1])),
+    (lambda call: True, _legacy_inline_buttons),
+]
+
+
+def _legacy_args(data):
+    if data.startswith("myreport_"):
+        return data.split("_")[1]
+    elif data == "back_to_myreports":
+        return None
+    elif data.startswith("edit_"):
+        return data.split("_")[1]
+    elif data.startswith("delete_"):
+        return data.split("_")[1]
+    elif data == "back_to_users":
+        return None
+    elif data.startswith("user_"):
+        return int(data.split("_")[1])
+    elif data.startswith("report_"):
+        return data.split("_", 2)
+    elif data == "back_to_mytasks":
+        return None
+    elif data.startswith("edittask_"):
+        return data.split("_")[1]
+    elif data.startswith("toggletask_"):
+        return data.split("_")[1]
+    elif data.startswith("deletetask_"):
+        return data.split("_")[1]
+    elif data.startswith("mytask_"):
+        return data.split("_")[1]
+    return None
+
+
+def to_encoded(data):
+    if data in LEGACY_EXACT:
+        return callbacks.encode(LEGACY_EXACT[data])
+    for prefix, action in LEGACY:
+        if data.startswith(prefix):
+            rest = data[len(prefix):]
+            args = rest.split("_", 1) if action == "report" else [rest]
+            return callbacks.encode(action, *args)
+    raise ValueError(data)
+
+
+def synthetic_stream(count):
+    weights = [
+        ("user_{u}", 25), ("report_{u}_2025-06-0{d} 16:4{d}:00", 25), ("back_to_users", 10),
+        ("myreport_{r}", 8), ("back_to_myreports", 4), ("edit_{r}", 4), ("delete_{r}", 2),
+        ("mytask_{r}", 8), ("back_to_mytasks", 4), ("toggletask_{r}", 5), ("edittask_{r}", 3),
+        ("deletetask_{r}", 2),
+    ]
+    templates = [t for t, _ in weights]
+    probabilities = [w for _, w in weights]
+    return [
+        random.choices(templates, probabilities)[0].format(
+            u=random.randrange(10 ** 8, 10 ** 9), r=random.randrange(1, 10 ** 6), d=random.randrange(1, 10))
+        for _ in range(count)
+    ]
+
+
+def build_router():
+    router = callbacks.CallbackRouter()
+    arg_types = {
+        'my_reports': (str, int), 'my_report': (int,), 'edit_report': (int,), 'delete_report': (int,),
+        'users': (), 'user_dates': (int, str, int), 'report': (int, str), 'my_tasks': (str, int),
+        'my_task': (int,), 'edit_task': (int,), 'toggle_task': (int,), 'delete_task': (int,),
+    }
+    for action, types in arg_types.items():
+        router.route(action, *types)(handler)
+    return router
+
+
+class Call:
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--stream", help="файл с callback_data в прежнем формате, по одному на строку")
+    args = parser.parse_args()
+
+    if args.stream:
+        with open(args.stream, encoding="utf-8") as f:
+            legacy = [line.strip() for line in f if line.strip()]
+    else:
+        legacy = synthetic_stream(args.calls)
+    encoded = [Call(to_encoded(data)) for data in legacy]
+    legacy = [Call(data) for data in legacy]
+    router = build_router()
+
+    start = time.perf_counter()
+    for call in legacy:
+        legacy_dispatch(call)
+    before = (time.perf_counter() - start) / len(legacy) * 1e9
+
+    start = time.perf_counter()
+    for call in encoded:
+        router.dispatch(call)
+    after = (time.perf_counter() - start) / len(encoded) * 1e9
+
+    longest = max(len(call.data.encode()) for call in encoded)
+    print(f"Нажатий: {len(legacy)}, самая длинная callback_data: {longest} байт")
+    print(f"if/elif со startswith: {before:.0f} нс на нажатие")
+    print(f"CallbackRouter:        {after:.0f} нс на нажатие")
+
+    print("По действиям (цепочка / маршрутизатор, нс):")
+    for prefix, _ in LEGACY + [(data, None) for data in LEGACY_EXACT]:
+        sample = [call for call in legacy if call.data.startswith(prefix)][:2000]
+        if not sample:
+            continue
+        sample_encoded = [Call(to_encoded(call.data)) for call in sample]
+        start = time.perf_counter()
+        for call in sample:
+            legacy_dispatch(call)
+        chain = (time.perf_counter() - start) / len(sample) * 1e9
+        start = time.perf_counter()
+        for call in sample_encoded:
+            router.dispatch(call)
+        routed = (time.perf_counter() - start) / len(sample) * 1e9
+        print(f"  {prefix:<20}{chain:>8.0f}{routed:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
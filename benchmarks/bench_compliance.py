@@ -0,0 +1,94 @@
+"""Бенчмарк сводки сдачи отчетов для админа.
+
+Засевает базу пользователями с Факт- и План-отчетами за несколько недель
+и сравнивает прежний список (последний отчет каждого пользователя и окно
+«последние 12 часов») с database.get_daily_compliance — одним запросом по
+диапазону рабочего дня с итогами и страницей пользователей.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_compliance.py [--users 10000] [--days 30] [--share 0.8]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp(prefix="bench_compliance_")
+os.environ["DB_NAME"] = os.path.join(_tmp, "bench.db")
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("ADMIN_IDS", "1")
+
+import database  # noqa: E402
+
+# Прежний запрос списка пользователей со статусом «отчет за последние 12 часов»
+OLD_QUERY = '''
+    SELECT u.user_id, u.first_name, u.username,
+           MAX(r.report_date) AS last_report_date,
+           MAX(r.report_date) >= datetime('now', '-12 hours') AS has_recent
+    FROM users u
+    JOIN reports r ON u.user_id = r.user_id
+    GROUP BY u.user_id
+    ORDER BY u.first_name
+'''
+
+
+def seed(users, days, share):
+    """Каждый рабочий день доля share пользователей сдает Факт и План около 18:00 по МСК (15:00 UTC)"""
+    today = datetime.utcnow().replace(hour=15, minute=0, second=0, microsecond=0)
+    with database.get_write_connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, first_name, username) VALUES (?, ?, ?)",
+            [(1000 + i, f"Сотрудник {i}", f"user{i}") for i in range(users)]
+        )
+        for day in range(days):
+            date = today - timedelta(days=day)
+            if date.weekday() >= 5:
+                continue
+            rows = [
+                (1000 + i, "Отчет", (date + timedelta(seconds=random.randrange(7200))).strftime("%Y-%m-%d %H:%M:%S"))
+                for i in range(users) if random.random() < share
+            ]
+            conn.executemany("INSERT INTO reports (user_id, report_text, report_date) VALUES (?, ?, ?)", rows)
+            conn.executemany("INSERT INTO tasks (user_id, task_text, task_date) VALUES (?, ?, ?)", rows)
+
+
+def measure(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--share", type=float, default=0.8, help="доля сдающих отчет в рабочий день")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    database.migrate_db()
+    print(f"Засев {args.users} пользователей за {args.days} дней...")
+    seed(args.users, args.days, args.share)
+    day = database.business_day()
+    conn = database.get_db_connection()
+
+    old_ms, rows = measure(lambda: conn.execute(OLD_QUERY).fetchall(), args.repeat)
+    print(f"Прежний список (MAX по всем отчетам): {old_ms:.1f} мс, строк {len(rows)}")
+
+    for page in (0, args.users // database.COMPLIANCE_PAGE_SIZE // 2):
+        new_ms, (rows, totals) = measure(
+            lambda: database.get_daily_compliance(
+                day, exclude_ids=[1], offset=page * database.COMPLIANCE_PAGE_SIZE),
+            args.repeat)
+        print(f"get_daily_compliance, страница {page}: {new_ms:.1f} мс, строк {len(rows)}; "
+              f"за {totals['day']}: Факт {totals['fact']}/{totals['users']}, План {totals['plan']}/{totals['users']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Бенчмарк выборок по дате: strftime() без индекса против диапазона по индексу.
+
+Засевает базу отчетами и задачами (по умолчанию 1 000 000 отчетов),
+затем измеряет задержку одной выборки до и после создания индексов.
+«После» — те же выборки с условием report_date >= начало суток AND < начало
+следующих, как в запросах database по дням (get_report_detail, выгрузка).
+
+Запуск из корня репозитория:
+    python benchmarks/bench_date_lookups.py [--reports 1000000] [--users 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp(prefix="bench_date_lookups_")
+os.environ["DB_NAME"] = os.path.join(_tmp, "bench.db")
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("ADMIN_IDS", "1")
+
+import database  # noqa: E402
+
+OLD_QUERIES = {
+    "get_report_by_date": (
+        '''SELECT id, report_text, edited_at FROM reports
+           WHERE user_id = ? AND strftime('%Y-%m-%d', report_date) = ? LIMIT 1'''
+    ),
+    "get_user_tasks_by_date": (
+        '''SELECT id, user_id, task_text, is_completed, task_date FROM tasks
+           WHERE user_id = ? AND strftime('%Y-%m-%d', task_date) = ? ORDER BY task_date'''
+    ),
+    "has_recent_report": (
+        '''SELECT COUNT(*) FROM reports
+           WHERE user_id = ? AND datetime(report_date) >= datetime('now', ?)'''
+    ),
+}
+
+NEW_QUERIES = {
+    "get_report_by_date": (
+        '''SELECT id, report_text, edited_at FROM reports
+           WHERE user_id = ? AND report_date >= ? AND report_date < ?
+           ORDER BY report_date LIMIT 1'''
+    ),
+    "get_user_tasks_by_date": (
+        '''SELECT id, user_id, task_text, is_completed, task_date FROM tasks
+           WHERE user_id = ? AND task_date >= ? AND task_date < ? ORDER BY task_date'''
+    ),
+}
+
+
+def day_range(date):
+    """Границы суток [начало, начало следующего дня) для метки 'YYYY-MM-DD HH:MM:SS'"""
+    day = datetime.strptime(date.split()[0], "%Y-%m-%d")
+    return day.strftime("%Y-%m-%d"), (day + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def seed(reports, users):
+    start = datetime.now() - timedelta(days=365)
+    rows = []
+    with database.get_write_connection() as conn:
+        for i in range(reports):
+            user_id = 1000 + i % users
+            date = start + timedelta(seconds=random.randrange(365 * 86400))
+            rows.append((user_id, "Отчет", date.strftime("%Y-%m-%d %H:%M:%S")))
+            if len(rows) >= 50000:
+                conn.executemany("INSERT INTO reports (user_id, report_text, report_date) VALUES (?, ?, ?)", rows)
+                conn.executemany("INSERT INTO tasks (user_id, task_text, task_date) VALUES (?, ?, ?)", rows[::10])
+                rows = []
+        if rows:
+            conn.executemany("INSERT INTO reports (user_id, report_text, report_date) VALUES (?, ?, ?)", rows)
+            conn.executemany("INSERT INTO tasks (user_id, task_text, task_date) VALUES (?, ?, ?)", rows[::10])
+
+
+def drop_indexes():
+    with database.get_write_connection() as conn:
+        conn.execute("DROP INDEX IF EXISTS idx_reports_user_date")
+        conn.execute("DROP INDEX IF EXISTS idx_tasks_user_date")
+
+
+def create_indexes():
+    """Индексы из миграции схемы: сама migrate_db их не пересоздаст, версия уже записана"""
+    with database.get_write_connection() as conn:
+        database._create_user_date_indexes(conn.cursor())
+
+
+def measure(func, lookups):
+    start = time.perf_counter()
+    for args in lookups:
+        func(*args)
+    return (time.perf_counter() - start) / len(lookups) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=50)
+    args = parser.parse_args()
+
+    database.migrate_db()
+    drop_indexes()
+    print(f"Засев {args.reports} отчетов...")
+    seed(args.reports, args.users)
+
+    today = datetime.now()
+    lookups = [
+        (1000 + random.randrange(args.users),
+         (today - timedelta(days=random.randrange(365))).strftime("%Y-%m-%d %H:%M:%S"))
+        for _ in range(args.lookups)
+    ]
+    conn = database.get_db_connection()
+
+    def old(name):
+        query = OLD_QUERIES[name]
+        if name == "has_recent_report":
+            return lambda user_id, date: conn.execute(query, (user_id, "-12 hours")).fetchall()
+        return lambda user_id, date: conn.execute(query, (user_id, date.split()[0])).fetchall()
+
+    def new(name):
+        query = NEW_QUERIES[name]
+        return lambda user_id, date: conn.execute(query, (user_id, *day_range(date))).fetchall()
+
+    before = {name: measure(old(name), lookups) for name in OLD_QUERIES}
+
+    create_indexes()
+    conn.execute("ANALYZE")
+    after = {
+        "get_report_by_date": measure(new("get_report_by_date"), lookups),
+        "get_user_tasks_by_date": measure(new("get_user_tasks_by_date"), lookups),
+        "has_recent_report": measure(lambda user_id, date: database.has_recent_report(user_id), lookups),
+    }
+
+    print(f"{'выборка':<26}{'до, мс':>10}{'после, мс':>12}{'ускорение':>12}")
+    for name in OLD_QUERIES:
+        print(f"{name:<26}{before[name]:>10.3f}{after[name]:>12.3f}{before[name] / after[name]:>11.0f}x")
+
+    database.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Микро-бенчмарк: соединение на каждый вызов против пула соединений.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_db_pool.py [--iterations 2000] [--users 200]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp(prefix="bench_db_pool_")
+os.environ["DB_NAME"] = os.path.join(_tmp, "bench.db")
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("ADMIN_IDS", "1")
+
+import database  # noqa: E402
+
+
+def per_call_connection():
+    """Прежнее поведение get_db_connection: новое соединение на каждый вызов"""
+    return sqlite3.connect(database.DB_NAME)
+
+
+def seed(users):
+    for user_id in range(1000, 1000 + users):
+        database.add_user_if_not_exists(user_id, f"User {user_id}", f"user{user_id}")
+        for i in range(5):
+            database.add_report(user_id, f"Отчет {i} пользователя {user_id}")
+            database.add_task(user_id, f"Задача {i} пользователя {user_id}")
+
+
+def run_case(name, func, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    elapsed = time.perf_counter() - start
+    return elapsed / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    database.migrate_db()
+    seed(args.users)
+    user_ids = list(range(1000, 1000 + args.users))
+
+    cases = [
+        # Без кэша пользователей: иначе оба столбца мерили бы попадания в кэш
+        ("get_user", lambda i: database._load_user(user_ids[i % len(user_ids)])),
+        ("get_user_reports", lambda i: database.get_user_reports(user_ids[i % len(user_ids)])),
+        ("get_user_tasks", lambda i: database.get_user_tasks(user_ids[i % len(user_ids)])),
+        ("has_recent_report", lambda i: database.has_recent_report(user_ids[i % len(user_ids)])),
+        ("get_report_by_id", lambda i: database.get_report_by_id(i % (len(user_ids) * 5) + 1)),
+        ("add_report", lambda i: database.add_report(user_ids[i % len(user_ids)], "bench")),
+    ]
+
+    pooled_get = database.get_db_connection
+    pooled_write = database.get_write_connection
+
+    print(f"{'функция':<22}{'на вызов, мкс':>16}{'пул, мкс':>12}{'ускорение':>12}")
+    for name, func in cases:
+        database.get_db_connection = per_call_connection
+        database.get_write_connection = per_call_connection
+        try:
+            before = run_case(name, func, args.iterations)
+        finally:
+            database.get_db_connection = pooled_get
+            database.get_write_connection = pooled_write
+        after = run_case(name, func, args.iterations)
+        print(f"{name:<22}{before:>16.1f}{after:>12.1f}{before / after:>11.1f}x")
+
+    database.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Бенчмарк истории правок: объем report_history и восстановление версий.
+
+Создает длинные отчеты и правит каждый много раз (в конец дописывается
+комментарий, изредка меняется строка в середине — как при замечаниях админа).
+Сравнивает объем, занятый историей, с полными копиями текста (как хранилось
+до дельт) и измеряет время database.get_report_version для старых и свежих
+версий.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_history.py [--reports 50] [--edits 40] [--lines 60]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp(prefix="bench_history_")
+os.environ["DB_NAME"] = os.path.join(_tmp, "bench.db")
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("ADMIN_IDS", "1")
+
+import database  # noqa: E402
+
+WORDS = ("встреча созвон клиент договор отчет задача проект сроки презентация документы "
+         "согласование бюджет поставка оплата счет макет правки тестирование релиз план").split()
+
+
+def line():
+    return " ".join(random.choices(WORDS, k=8))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=50)
+    parser.add_argument("--edits", type=int, default=40)
+    parser.add_argument("--lines", type=int, default=60)
+    args = parser.parse_args()
+
+    database.migrate_db()
+    database.add_user_if_not_exists(1000, "Bench", "bench")
+
+    full_bytes = 0
+    report_ids = []
+    started = time.perf_counter()
+    for _ in range(args.reports):
+        lines = [line() for _ in range(args.lines)]
+        report_id = database.add_report(1000, "\n".join(lines))
+        report_ids.append(report_id)
+        for edit in range(args.edits):
+            full_bytes += len("\n".join(lines).encode())
+            if edit % 5 == 4:
+                lines[random.randrange(len(lines))] = line()
+            else:
+                lines.append(f"Комментарий {edit}: {line()}")
+            database.update_report(report_id, "\n".join(lines), 1)
+    edit_seconds = time.perf_counter() - started
+
+    with database.get_db_connection() as conn:
+        stored_bytes, snapshots = conn.execute(
+            "SELECT SUM(COALESCE(LENGTH(CAST(delta AS BLOB)), 0) + COALESCE(LENGTH(CAST(report_text AS BLOB)), 0)), "
+            "SUM(delta IS NULL) FROM report_history"
+        ).fetchone()
+
+    edits = args.reports * args.edits
+    print(f"Правок: {edits}, {edit_seconds / edits * 1000:.2f} мс на правку")
+    print(f"История полными копиями: {full_bytes / 1024:.0f} КБ")
+    print(f"История дельтами:        {stored_bytes / 1024:.0f} КБ "
+          f"({stored_bytes / full_bytes:.1%}), снимков {snapshots} из {edits}")
+
+    for title, version in (("первая версия", 1), ("последняя версия", args.edits)):
+        samples = []
+        for report_id in report_ids:
+            mark = time.perf_counter()
+            database.get_report_version(report_id, version)
+            samples.append(time.perf_counter() - mark)
+        print(f"get_report_version, {title:<17}медиана {statistics.median(samples) * 1000:.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
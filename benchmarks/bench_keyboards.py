@@ -0,0 +1,62 @@
+"""Бенчмарк клавиатур: стоимость сборки и сериализации reply_markup на отправку.
+
+«До» — клавиатура строится объектами telebot и сериализуется to_json(), как
+при каждой отправке раньше (функции buttons._build_*). «После» — готовый JSON
+постоянных клавиатур и подстановка id в шаблон инлайн-клавиатуры действий.
+В обоих случаях вызывается to_json(), как это делает telebot перед запросом.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_keyboards.py [--sends 100000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("ADMIN_IDS", "1")
+
+import buttons  # noqa: E402
+
+CASES = [
+    ("главная клавиатура",
+     lambda i: buttons._build_main_keyboard(),
+     lambda i: buttons.get_main_keyboard()),
+    ("клавиатура админа",
+     lambda i: buttons._build_admin_keyboard(),
+     lambda i: buttons.get_admin_keyboard()),
+    ("действия со своим отчетом",
+     lambda i: buttons._build_my_report_actions(i),
+     lambda i: buttons.generate_my_report_actions_inline(i)),
+    ("действия с отчетом (админ)",
+     lambda i: buttons._build_report_actions(i % 500, i),
+     lambda i: buttons.generate_report_actions_inline(i % 500, i)),
+    ("действия с задачей",
+     lambda i: buttons._build_task_actions(i),
+     lambda i: buttons.generate_task_actions_inline(i)),
+]
+
+
+def measure(make, sends):
+    started = time.perf_counter()
+    for i in range(sends):
+        make(100000 + i).to_json()
+    return (time.perf_counter() - started) / sends * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sends", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'Клавиатура':<30}{'до, мкс':>10}{'после, мкс':>12}{'ускорение':>11}")
+    for title, before, after in CASES:
+        slow = measure(before, args.sends)
+        fast = measure(after, args.sends)
+        print(f"{title:<30}{slow:>10.2f}{fast:>12.2f}{slow / fast:>10.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Нагрузочный прогон бота на локальной заглушке Bot API.
+
+Синтетические пользователи проходят сценарии через настоящие обработчики
+bot.py: /start, сдача Факт-отчета, План-отчет, просмотр отчетов админами.
+Обновления идут через webhook.UpdateDispatcher, как в рабочем режиме, а
+ответы бота уходят в fake_bot_api.FakeBotApi (sendMessage, editMessageText,
+answerCallbackQuery). Для каждого сценария выводятся пропускная способность,
+p50/p95/p99 времени обработки одного обновления и время в функциях database.
+
+Запуск из корня репозитория (база создается во временном файле):
+    python benchmarks/bench_load.py [--users 2000] [--admins 5] [--latency 0.02] [--workers 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_NAME", os.path.join(tempfile.mkdtemp(), "bench_load.db"))
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("ADMIN_IDS", ",".join(str(admin_id) for admin_id in range(1, 6)))
+os.environ.setdefault("ADMIN_DIGEST_WINDOW", "0.5")
+
+import telebot  # noqa: E402
+import bot as bot_module  # noqa: E402
+import callbacks  # noqa: E402
+import database  # noqa: E402
+import webhook  # noqa: E402
+from fake_bot_api import FakeBotApi  # noqa: E402
+
+FIRST_USER_ID = 1000
+
+
+class DbTimer:
+    """Подменяет публичные функции database обертками, суммирующими время по потокам"""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.total = 0.0
+        self.calls = 0
+
+    def install(self):
+        for name, func in list(vars(database).items()):
+            if callable(func) and not name.startswith('_') and getattr(func, '__module__', None) == 'database':
+                setattr(database, name, self._wrap(func))
+
+    def _wrap(self, func):
+        local = self.local
+
+        def timed(*args, **kwargs):
+            # Вложенные вызовы (can_edit_report -> get_report_owner) считаем один раз
+            depth = getattr(local, 'depth', 0)
+            local.depth = depth + 1
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                local.depth = depth
+                if not depth:
+                    elapsed = time.perf_counter() - started
+                    with self.lock:
+                        self.total += elapsed
+                        self.calls += 1
+        return timed
+
+    def reset(self):
+        with self.lock:
+            self.total = 0.0
+            self.calls = 0
+
+
+class TimedBot:
+    """Передает обновления боту и записывает время обработки каждого"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.latencies = []
+        self.lock = threading.Lock()
+        self.done = threading.Semaphore(0)
+
+    def process_new_updates(self, updates):
+        started = time.perf_counter()
+        try:
+            self.bot.process_new_updates(updates)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.latencies.append(elapsed)
+            self.done.release()
+
+
+def message(user_id, text):
+    return {'message': {
+        'message_id': 1, 'date': int(time.time()), 'text': text,
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'username': f'user{user_id}'},
+    }}
+
+
+def callback(user_id, data):
+    return {'callback_query': {
+        'id': str(user_id), 'chat_instance': 'bench', 'data': data,
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'},
+        'message': {'message_id': 1, 'date': int(time.time()), 'text': '-',
+                    'chat': {'id': user_id, 'type': 'private'}},
+    }}
+
+
+def scenario_start(user_ids, admin_ids):
+    for user_id in user_ids + admin_ids:
+        yield message(user_id, '/start')
+
+
+def scenario_report(user_ids, admin_ids):
+    for user_id in user_ids:
+        yield message(user_id, 'Начать Факт-отчет')
+        yield message(user_id, f'Сделано за день пользователем {user_id}: задачи 1, 2, 3')
+        yield message(user_id, 'Мои Факт-отчеты')
+
+
+def scenario_plan(user_ids, admin_ids):
+    for user_id in user_ids:
+        yield message(user_id, 'Начать План-отчет')
+        yield message(user_id, f'План на завтра пользователя {user_id}')
+        yield message(user_id, 'Мои План-отчеты')
+
+
+def scenario_admin(user_ids, admin_ids):
+    conn = database.get_db_connection()
+    reports = conn.execute('SELECT id, user_id FROM reports ORDER BY id').fetchall()
+    for index, (report_id, user_id) in enumerate(reports):
+        admin_id = admin_ids[index % len(admin_ids)]
+        if index % 20 == 0:
+            yield message(admin_id, 'Просмотреть отчеты')
+            yield callback(admin_id, callbacks.encode('users'))
+        yield callback(admin_id, callbacks.encode('user_dates', user_id))
+        yield callback(admin_id, callbacks.encode('report', report_id))
+
+
+SCENARIOS = [
+    ('start', scenario_start),
+    ('report', scenario_report),
+    ('plan', scenario_plan),
+    ('admin', scenario_admin),
+]
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def run_scenario(name, updates, timed_bot, db_timer, api, workers):
+    dispatcher = webhook.UpdateDispatcher(timed_bot, workers, queue_size=workers * 100)
+    dispatcher.start()
+    timed_bot.latencies = []
+    db_timer.reset()
+    api.calls.clear()
+
+    started = time.perf_counter()
+    count = 0
+    for count, update in enumerate(updates, 1):
+        dispatcher.submit(dict(update, update_id=count), block=True)
+    for _ in range(count):
+        timed_bot.done.acquire()
+    duration = time.perf_counter() - started
+    dispatcher.stop()
+
+    latencies = sorted(timed_bot.latencies)
+    if not latencies:
+        print(f"{name:>7}: нет обновлений")
+        return
+    print(f"{name:>7}: {count} обновлений за {duration:.1f} с, {count / duration:.0f}/с; "
+          f"обработка p50 {percentile(latencies, 0.5) * 1000:.1f} мс, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.1f} мс, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f} мс; "
+          f"БД {db_timer.total * 1000 / count:.2f} мс на обновление ({db_timer.calls} вызовов); "
+          f"API: {', '.join(f'{method} {calls}' for method, calls in sorted(api.calls.items()))}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--admins", type=int, default=len(bot_module.ADMIN_IDS))
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа заглушки, с")
+    parser.add_argument("--workers", type=int, default=webhook.WEBHOOK_WORKERS)
+    parser.add_argument("--scenarios", default=",".join(name for name, _ in SCENARIOS))
+    args = parser.parse_args()
+
+    database.migrate_db()
+    api = FakeBotApi(latency=args.latency).start()
+    telebot.apihelper.API_URL = api.api_url
+    bot = bot_module.bot
+    bot.threaded = False
+
+    db_timer = DbTimer()
+    db_timer.install()
+    timed_bot = TimedBot(bot)
+
+    user_ids = list(range(FIRST_USER_ID, FIRST_USER_ID + args.users))
+    admin_ids = bot_module.ADMIN_IDS[:args.admins]
+    print(f"База: {database.DB_NAME}; пользователей {args.users}, админов {len(admin_ids)}, "
+          f"потоков {args.workers}, задержка API {args.latency * 1000:.0f} мс")
+
+    selected = args.scenarios.split(",")
+    for name, scenario in SCENARIOS:
+        if name in selected:
+            run_scenario(name, scenario(user_ids, admin_ids), timed_bot, db_timer, api, args.workers)
+
+    bot_module.admin_notifier.stop()
+    api.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Бенчмарк поиска по отчетам: LIKE '%слово%' против FTS5 (database.search).
+
+Засевает базу отчетами из случайных слов (по умолчанию 1 000 000) — FTS5-индекс
+заполняется триггерами при вставке — и сравнивает задержку поиска редкого
+и частого слова.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_search.py [--reports 1000000] [--users 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp(prefix="bench_search_")
+os.environ["DB_NAME"] = os.path.join(_tmp, "bench.db")
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("ADMIN_IDS", "1")
+
+import database  # noqa: E402
+
+WORDS = ("встреча созвон клиент договор отчет задача проект сроки презентация документы "
+         "согласование бюджет поставка оплата счет макет правки тестирование релиз план").split()
+CLIENTS = ["Ромашка", "Лютик", "Василек", "Колокольчик", "Незабудка"]
+
+
+def seed(reports, users):
+    rows = []
+    with database.get_write_connection() as conn:
+        for i in range(reports):
+            words = random.choices(WORDS, k=12)
+            # Название клиента встречается примерно в одном отчете из тысячи
+            if random.random() < 0.001:
+                words.insert(random.randrange(len(words)), random.choice(CLIENTS))
+            rows.append((1000 + i % users, " ".join(words)))
+            if len(rows) >= 50000:
+                conn.executemany("INSERT INTO reports (user_id, report_text) VALUES (?, ?)", rows)
+                rows = []
+        if rows:
+            conn.executemany("INSERT INTO reports (user_id, report_text) VALUES (?, ?)", rows)
+
+
+def measure(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    database.migrate_db()
+    print(f"Засев {args.reports} отчетов...")
+    started = time.perf_counter()
+    seed(args.reports, args.users)
+    print(f"Засев с индексацией: {time.perf_counter() - started:.1f} с")
+    conn = database.get_db_connection()
+
+    # «бюдж*» — явный поиск по началу слова: префиксный запрос FTS5
+    for term in ("Ромашка", "бюджет", "бюдж*"):
+        like_ms, rows = measure(lambda: conn.execute(
+            '''SELECT id, user_id, report_date, report_text FROM reports
+               WHERE report_text LIKE ? ORDER BY report_date DESC LIMIT ?''',
+            (f"%{term.rstrip('*')}%", database.SEARCH_PAGE_SIZE)).fetchall(), args.repeat)
+        fts_ms, (rows, has_more) = measure(lambda: database.search(term), args.repeat)
+        page_ms, _ = measure(lambda: database.search(term, offset=5 * database.SEARCH_PAGE_SIZE), args.repeat)
+        print(f"«{term}»: LIKE {like_ms:.1f} мс; FTS5 {fts_ms:.1f} мс (6-я страница {page_ms:.1f} мс), "
+              f"результатов на странице {len(rows)}")
+
+
+if __name__ == "__main__":
+    main()
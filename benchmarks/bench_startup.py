@@ -0,0 +1,95 @@
+"""Бенчмарк запуска бота: импорт модулей, миграции и bootstrap() против бюджета.
+
+Каждый замер — отдельный процесс Python с новой базой, поэтому учитываются
+холодный импорт и создание схемы. Этапы:
+    импорт config + database — модули без TeleBot (планировщик, выгрузка, retention);
+    импорт bot — TeleBot и регистрация обработчиков;
+    migrate_db на пустой базе и на актуальной схеме;
+    run.bootstrap() — схема, метрики и планировщик перед приемом обновлений.
+Итог «импорт run + bootstrap» сравнивается с бюджетом; при превышении код
+возврата 1, чтобы бенчмарк можно было запускать в CI.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_startup.py [--runs 5] [--budget-ms 500]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, sys, time
+sys.path.insert(0, {root!r})
+timings = {{}}
+started = time.perf_counter()
+import config, database
+timings['import_database'] = time.perf_counter() - started
+mark = time.perf_counter()
+import bot
+timings['import_bot'] = time.perf_counter() - mark
+import run
+timings['import_run'] = time.perf_counter() - started
+mark = time.perf_counter()
+database.migrate_db()
+timings['migrate_fresh'] = time.perf_counter() - mark
+mark = time.perf_counter()
+database.migrate_db()
+timings['migrate_current'] = time.perf_counter() - mark
+mark = time.perf_counter()
+jobs = run.bootstrap()
+timings['bootstrap'] = time.perf_counter() - mark
+jobs.stop(timeout=5)
+print(json.dumps(timings))
+'''
+
+STAGES = [
+    ('import_database', "импорт config + database"),
+    ('import_bot', "импорт bot"),
+    ('import_run', "импорт run (все модули)"),
+    ('migrate_fresh', "migrate_db, пустая база"),
+    ('migrate_current', "migrate_db, актуальная схема"),
+    ('bootstrap', "bootstrap(), актуальная схема"),
+]
+
+
+def run_once(tmp, index):
+    env = dict(os.environ)
+    env["DB_NAME"] = os.path.join(tmp, f"startup_{index}.db")
+    env.setdefault("BOT_TOKEN", "123456:bench")
+    env.setdefault("ADMIN_IDS", "1")
+    env["METRICS_PORT"] = "0"
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD.format(root=ROOT)],
+        env=env, cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "500")),
+                        help="бюджет на импорт run и bootstrap(), мс")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_startup_")
+    runs = [run_once(tmp, index) for index in range(args.runs)]
+    medians = {key: statistics.median(run[key] for run in runs) * 1000 for key, _ in STAGES}
+
+    print(f"Медиана по {args.runs} запускам:")
+    for key, title in STAGES:
+        print(f"  {title:<32}{medians[key]:>9.1f} мс")
+
+    total = medians['import_run'] + medians['bootstrap']
+    verdict = "в пределах бюджета" if total <= args.budget_ms else "БЮДЖЕТ ПРЕВЫШЕН"
+    print(f"Импорт run + bootstrap(): {total:.1f} мс при бюджете {args.budget_ms:.0f} мс — {verdict}")
+    sys.exit(0 if total <= args.budget_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
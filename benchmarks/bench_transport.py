@@ -0,0 +1,70 @@
+"""Бенчмарк исходящего транспорта: сессии telebot по умолчанию против transport.
+
+Несколько раз подряд запускает broadcast.broadcast в локальную заглушку Bot API
+(как ежедневные напоминания) для разного числа потоков рассылки. Лимит
+скорости рассылки снят, чтобы мерить только транспорт. Для каждого режима
+выводятся пропускная способность и число новых TCP-соединений, принятых
+заглушкой; для transport — еще p50/p95 sendMessage из transport.stats().
+TLS локально не воспроизводится, поэтому каждое новое соединение на реальном
+API стоит еще и рукопожатия.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_transport.py [--messages 400] [--rounds 3] [--latency 0.02] [--workers 1,4,16,32]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telebot  # noqa: E402
+import broadcast  # noqa: E402
+import transport  # noqa: E402
+from fake_bot_api import FakeBotApi  # noqa: E402
+
+
+def run_rounds(bot, api, messages, rounds, workers):
+    connections = api.connections
+    sent = 0
+    started = time.monotonic()
+    for _ in range(rounds):
+        summary = broadcast.broadcast(
+            bot, ((1000 + i, "Kind Reminder") for i in range(messages)),
+            workers=workers, rate=1_000_000
+        )
+        sent += summary['sent']
+    return sent / (time.monotonic() - started), api.connections - connections
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=400, help="сообщений в одной рассылке")
+    parser.add_argument("--rounds", type=int, default=3, help="рассылок подряд")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа заглушки, с")
+    parser.add_argument("--workers", default="1,4,16,32", help="числа потоков рассылки через запятую")
+    args = parser.parse_args()
+
+    api = FakeBotApi(latency=args.latency).start()
+    telebot.apihelper.API_URL = api.api_url
+    bot = telebot.TeleBot("123456:bench", threaded=False)
+
+    print(f"Рассылок по {args.messages} сообщений: {args.rounds}, задержка API {args.latency * 1000:.0f} мс, "
+          f"пул transport {transport.API_POOL_SIZE}")
+    print(f"{'потоков':>8}{'telebot, сообщ/с':>18}{'соедин.':>9}{'transport, сообщ/с':>20}{'соедин.':>9}"
+          f"{'p50, мс':>9}{'p95, мс':>9}")
+    for workers in [int(value) for value in args.workers.split(',')]:
+        telebot.apihelper.CUSTOM_REQUEST_SENDER = None
+        default_rate, default_connections = run_rounds(bot, api, args.messages, args.rounds, workers)
+
+        transport.install()
+        transport.reset_stats()
+        pooled_rate, pooled_connections = run_rounds(bot, api, args.messages, args.rounds, workers)
+        send_stats = transport.stats()['sendMessage']
+        print(f"{workers:>8}{default_rate:>18.0f}{default_connections:>9}{pooled_rate:>20.0f}{pooled_connections:>9}"
+              f"{send_stats['p50_seconds'] * 1000:>9.1f}{send_stats['p95_seconds'] * 1000:>9.1f}")
+    api.stop()
+
+
+if __name__ == "__main__":
+    main()
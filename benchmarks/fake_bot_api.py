@@ -0,0 +1,173 @@
+"""Локальная заглушка Telegram Bot API для бенчмарков и нагрузочных прогонов.
+
+Бот направляется на нее через TELEGRAM_API_URL (или telebot.apihelper.API_URL):
+    python benchmarks/fake_bot_api.py --port 8081
+    TELEGRAM_API_URL=http://127.0.0.1:8081/bot{0}/{1} python run.py
+
+Заглушка может добавлять задержку ответа и отвечать 429 с retry_after,
+если бот превышает заданный лимит сообщений в секунду. Как и настоящий API,
+она держит соединения keep-alive (HTTP/1.1) и считает принятые соединения.
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class FakeBotApi:
+    """Состояние заглушки: счетчики вызовов, лимит и очередь обновлений для getUpdates"""
+
+    def __init__(self, latency=0.0, rate_limit=None, retry_after=1):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.rejected = Counter()
+        self.sent = []
+        self.updates = deque()
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.recent = deque()
+        self.connections = 0  # Принято TCP-соединений
+        self.lock = threading.Lock()
+        self.server = None
+
+    # --- Обработка методов Bot API ---
+
+    def handle(self, method, params):
+        with self.lock:
+            self.calls[method] += 1
+            if self._rate_limited(method):
+                self.rejected[method] += 1
+                return 429, {
+                    'ok': False, 'error_code': 429,
+                    'description': f'Too Many Requests: retry after {self.retry_after}',
+                    'parameters': {'retry_after': self.retry_after},
+                }
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': self._take_updates(params)}
+        if self.latency:
+            time.sleep(self.latency)
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}}
+        if method in ('sendMessage', 'editMessageText', 'sendDocument'):
+            chat_id = int(params.get('chat_id', 0))
+            with self.lock:
+                self.sent.append((method, chat_id, params.get('text')))
+                message_id = next(self.message_ids)
+            return 200, {'ok': True, 'result': {
+                'message_id': message_id, 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'}, 'text': params.get('text', ''),
+            }}
+        return 200, {'ok': True, 'result': True}
+
+    def _rate_limited(self, method):
+        if not self.rate_limit or method not in ('sendMessage', 'editMessageText'):
+            return False
+        now = time.monotonic()
+        while self.recent and now - self.recent[0] > 1.0:
+            self.recent.popleft()
+        if len(self.recent) >= self.rate_limit:
+            return True
+        self.recent.append(now)
+        return False
+
+    def _take_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+        deadline = time.monotonic() + min(timeout, 1.0)
+        while True:
+            with self.lock:
+                while self.updates and self.updates[0]['update_id'] < offset:
+                    self.updates.popleft()
+                if self.updates or time.monotonic() >= deadline:
+                    return list(itertools.islice(self.updates, limit))
+            time.sleep(0.01)
+
+    def push_update(self, update):
+        """Добавляет обновление (без update_id) в очередь getUpdates"""
+        with self.lock:
+            update = dict(update, update_id=next(self.update_ids))
+            self.updates.append(update)
+            return update
+
+    # --- HTTP-сервер ---
+
+    def start(self, host='127.0.0.1', port=0):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Заголовки и тело уходят разными записями; без TCP_NODELAY на
+            # keep-alive каждый ответ ждет подтверждения клиента ~40 мс
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with api.lock:
+                    api.connections += 1
+
+            def _serve(self):
+                url = urlsplit(self.path)
+                method = url.path.rsplit('/', 1)[-1]
+                params = dict(parse_qsl(url.query))
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    body = self.rfile.read(length)
+                    if self.headers.get('Content-Type', '').startswith('application/json'):
+                        params.update(json.loads(body))
+                    elif self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+                        params.update(parse_qsl(body.decode()))
+                status, payload = api.handle(method, params)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def api_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, с")
+    parser.add_argument("--rate-limit", type=int, default=None, help="сообщений в секунду до ответа 429")
+    args = parser.parse_args()
+
+    api = FakeBotApi(args.latency, args.rate_limit).start(args.host, args.port)
+    print(f"Заглушка Bot API: {api.api_url}")
+    try:
+        while True:
+            time.sleep(5)
+            print(dict(api.calls))
+    except KeyboardInterrupt:
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
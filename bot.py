@@ -1,25 +1,48 @@
 import telebot
+import broadcast
 import buttons
+import cache
+import callbacks
+import config
+import conversation
 import database
+import export
+import html
+import metrics
+import notifications
+import retention
+import scheduler
 import os
 import threading
-import schedule
-import time
 import pytz
-from datetime import datetime, timedelta
-from dotenv import load_dotenv
+from datetime import datetime
 from telebot import types
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton, ForceReply, ReplyKeyboardMarkup, KeyboardButton
 
-load_dotenv()
-
-BOT_TOKEN = os.getenv("BOT_TOKEN")
+BOT_TOKEN = config.BOT_TOKEN
+if config.TELEGRAM_API_URL:
+    telebot.apihelper.API_URL = config.TELEGRAM_API_URL
 bot = telebot.TeleBot(BOT_TOKEN)
-ADMIN_IDS = list(map(int, os.getenv('ADMIN_IDS').split(',')))
+ADMIN_IDS = config.ADMIN_IDS
+admin_notifier = notifications.AdminNotifier(bot, ADMIN_IDS)
+router = callbacks.CallbackRouter()
+conversations = conversation.ConversationStore()
+# Последний поисковый запрос админа по чату: кнопки листания несут только номер страницы
+search_queries = cache.TTLCache(1024, float(os.getenv("SEARCH_QUERY_TTL", "3600")), name="search_queries")
 
 def is_admin(user_id):
     return user_id in ADMIN_IDS
 
+# Регистрируется первым: пока диалог не завершен, следующее сообщение — его шаг
+@bot.message_handler(func=lambda m: conversations.get(m.chat.id) is not None)
+def handle_conversation_step(message):
+    state, payload = conversations.pop(message.chat.id)
+    step = CONVERSATION_STEPS.get(state)
+    if step is None:
+        print(f"Неизвестное состояние диалога {state} в чате {message.chat.id}")
+        return
+    step(message, **payload)
+
 @bot.message_handler(commands=['start'])
 def start_command(message):
     user_name = message.from_user.first_name
@@ -69,35 +92,28 @@ def start_command(message):
         )
 @bot.message_handler(func=lambda m: m.text == "Начать Факт-отчет")
 def ask_for_report(message):
-    msg = bot.send_message(
+    bot.send_message(
         message.chat.id,
         "📝Введите текст Факт-отчета с выполненными задачами на текущий день:",
         reply_markup=ForceReply()
     )
-    bot.register_next_step_handler(msg, save_report)
+    conversations.set(message.chat.id, 'report')
 
 def save_report(message):
     try:
         report_id = database.add_report(message.from_user.id, message.text)
+        metrics.inc('reports_saved_total')
         bot.send_message(
             message.chat.id,
             "✅Ваш отчет сохранен!",
             reply_markup=buttons.get_admin_keyboard() if is_admin(message.from_user.id) else buttons.get_main_keyboard()
         )
         
-        # Уведомление админов
-        user = database.get_user(message.from_user.id)
-        user_name = user[1] if user else f"User {message.from_user.id}"
-        for admin_id in ADMIN_IDS:
-            try:
-                bot.send_message(
-                    admin_id,
-                    f"📩 Новый отчет от {user_name}:\n\n{message.text}"
-                )
-            except Exception as e:
-                print(f"Ошибка уведомления админа {admin_id}: {e}")
+        # Уведомление админов отправляется в фоне
+        admin_notifier.notify(message.from_user.id, message.text)
     except Exception as e:
         print(f"Ошибка сохранения отчета: {e}")
+        metrics.inc('errors_total', where='save_report', type=type(e).__name__)
         bot.send_message(
             message.chat.id,
             "❌ Ошибка при сохранении отчета",
@@ -106,8 +122,7 @@ def save_report(message):
 
 @bot.message_handler(func=lambda m: m.text == "Мои Факт-отчеты")
 def show_my_reports(message):
-    reports = database.get_user_reports(message.from_user.id)
-    if not reports:
+    if not database.user_has_reports(message.from_user.id):
         bot.send_message(
             message.chat.id,
             "У вас пока нет сохраненных отчетов.",
@@ -153,84 +168,99 @@ def process_edit_report(message, report_id):
             reply_markup=keyboard
         )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("edit_"))
-def handle_edit_report(call):
-    try:
-        report_id = call.data.split("_")[1]
-        
-        if not database.can_edit_report(call.from_user.id, report_id):
-            bot.answer_callback_query(call.id, "❌ Вы не можете редактировать этот отчет")
-            return
-            
-        # Получаем старый отчет из базы
-        old_report = database.get_report_by_id(report_id)
-        if not old_report:
-            bot.answer_callback_query(call.id, "❌ Отчет не найден")
-            return
-            
-        old_text = old_report[2]  # report_text находится на 3 позиции
-        
-        # Отправляем сообщение с ForceReply
-        msg = bot.send_message(
-            call.message.chat.id,
-            "✏️ Редактируйте факт-отчет (старый текст ниже):",
-            reply_markup=ForceReply(selective=True)
-        )
-        
-        # Отправляем старый текст как отдельное сообщение
-        bot.send_message(
-            call.message.chat.id,
-            f"Текущий текст:\n\n{old_text}",
-            reply_to_message_id=msg.message_id
-        )
+def answer(call, text=None):
+    """Отвечает на callback-запрос и помечает его отвеченным"""
+    call.answered = True
+    bot.answer_callback_query(call.id, text)
+
+@router.route('edit_report', int)
+def handle_edit_report(call, report_id):
+    if not database.can_edit_report(call.from_user.id, report_id):
+        answer(call, "❌ Вы не можете редактировать этот отчет")
+        return
         
-        # Регистрируем обработчик
-        bot.register_next_step_handler(msg, process_edit_report, report_id)
-        bot.answer_callback_query(call.id)
+    # Получаем старый отчет из базы
+    old_report = database.get_report_by_id(report_id)
+    if not old_report:
+        answer(call, "❌ Отчет не найден")
+        return
         
-    except Exception as e:
-        print(f"Ошибка в handle_edit_report: {e}")
-        bot.answer_callback_query(call.id, "❌ Ошибка при редактировании")
-
-def reminder_scheduler():                                           #Функция для запуска планировщика напоминаний
-    print("Планировщик напоминаний инициализирован")
+    old_text = old_report[2]  # report_text находится на 3 позиции
     
-    # Установите правильный часовой пояс (пример для МСК)
-
-    msk = pytz.timezone('Europe/Moscow')
+    # Отправляем сообщение с ForceReply
+    msg = bot.send_message(
+        call.message.chat.id,
+        "✏️ Редактируйте факт-отчет (старый текст ниже):",
+        reply_markup=ForceReply(selective=True)
+    )
     
-    schedule.every().day.at("17:00", tz=msk).do(send_daily_reminder)
+    # Отправляем старый текст как отдельное сообщение
+    bot.send_message(
+        call.message.chat.id,
+        f"Текущий текст:\n\n{old_text}",
+        reply_to_message_id=msg.message_id
+    )
     
-    while True:
-        schedule.run_pending()
-        time.sleep(60)
+    # Ждем новый текст отчета следующим сообщением
+    conversations.set(call.message.chat.id, 'edit_report', report_id=report_id)
+
+# Этапы напоминаний: (этап, время по МСК); каждый следующий получают только не сдавшие
+REMINDER_STAGES = [
+    ('first', os.getenv("REMINDER_TIME", "17:00")),
+    ('final', os.getenv("REMINDER_ESCALATION_TIME", "18:30")),
+]
+
+# Сколько секунд после пропущенного времени напоминание еще стоит отправить
+REMINDER_CATCH_UP = int(os.getenv("REMINDER_CATCH_UP", "1800"))
+
+def create_scheduler():
+    """Планировщик напоминаний (по будням, МСК) и ежедневной очистки"""
+    jobs = scheduler.Scheduler()
+    for stage, at in REMINDER_STAGES:
+        jobs.every_day(f"reminder_{stage}", at, send_daily_reminder, stage,
+                       weekdays=scheduler.WORKDAYS, tz='Europe/Moscow', catch_up=REMINDER_CATCH_UP)
+    # Очистку догоняем в течение суток: она безопасна в любое время
+    jobs.every_day("retention", retention.RETENTION_TIME, retention.run_retention,
+                   tz='Europe/Moscow', catch_up=24 * 3600)
+    return jobs
+
+def reminder_text(stage, has_fact, has_plan):
+    """Текст напоминания: упоминает только несданные отчеты"""
+    missing = []
+    if not has_fact:
+        missing.append("Нажмите кнопку «Начать Факт-отчет», чтобы сдать рабочий отчет за сегодня.")
+    if not has_plan:
+        missing.append("Нажмите кнопку «Начать План-отчет», чтобы запланировать задачи на предстоящий рабочий день.")
+    if stage == 'final':
+        header = "⏰ До 19:00 по МСК осталось полчаса, а отчет за сегодня еще не сдан!"
+    else:
+        header = "Kind Reminder: сегодня до 19:00 по МСК необходимо сдать отчет❤️"
+    return "\n".join([header] + missing)
 
-def send_daily_reminder():
-    print(f"[{datetime.now()}] Запуск send_daily_reminder")
+def send_daily_reminder(stage='first'):
+    print(f"[{datetime.now()}] Запуск send_daily_reminder ({stage})")
     
-    # Получаем текущий день недели (0 - понедельник, 6 - воскресенье)
-    current_weekday = datetime.now().weekday()
-    
-    # Если суббота (5) или воскресенье (6), пропускаем отправку уведомлений
-    if current_weekday >= 5:  # 5 и 6 - это суббота и воскресенье
-        print("Сегодня выходной, уведомления не отправляются")
-        return
+    # Дни недели задает планировщик (только будни)
+    now = datetime.now(pytz.timezone('Europe/Moscow'))
     
     try:
-        users = database.get_all_users()
+        # Только те, кто еще не сдал отчеты и не получил этот этап (админы исключены)
+        day = now.strftime('%Y-%m-%d')
+        users = database.get_pending_users(day, exclude_ids=ADMIN_IDS, stage=stage)
         print(f"Найдено пользователей для напоминания: {len(users)}")
         
-        for user_id, first_name in users:
-            try:
-                print(f"Отправка напоминания пользователю {user_id} ({first_name})")
-                bot.send_message(
-                    user_id,
-                    f"Kind Reminder: сегодня до 19:00 по МСК необходимо сдать отчет❤️\n"
-                    "Нажмите кнопку «Начать Факт-отчет», чтобы сдать рабочий отчет за сегодня.\n"
-                    "Нажмите кнопку «Начать План-отчет», чтобы запланировать задачи на предстоящий рабочий день."
-                )
-            except Exception as e:
-                print(f"Ошибка отправки пользователю {user_id}: {str(e)}")
+        results = []
+        summary = broadcast.broadcast(
+            bot,
+            ((user_id, reminder_text(stage, has_fact, has_plan)) for user_id, first_name, has_fact, has_plan in users),
+            on_result=lambda chat_id, error: results.append((chat_id, error)),
+            name=f"Напоминание ({stage})"
+        )
+        database.record_reminder_deliveries(day, stage, results)
+        metrics.inc('reminders_sent_total', summary['sent'], stage=stage)
+        metrics.inc('reminders_failed_total', summary['failed'], stage=stage)
+        for user_id, error in summary['errors'].items():
+            print(f"Ошибка отправки пользователю {user_id}: {error}")
     except Exception as e:
         print(f"Критическая ошибка в send_daily_reminder: {str(e)}")
 
@@ -291,305 +321,304 @@ def start_rules_admin(message):
 
 @bot.message_handler(func=lambda m: m.text == "Просмотреть отчеты" and is_admin(m.from_user.id))
 def admin_view_reports(message):
-    users = database.get_users_with_reports()
-    if not users:
-        bot.send_message(message.chat.id, "Нет пользователей с отчетами.")
+    text, markup = buttons.generate_users_summary()
+    bot.send_message(message.chat.id, text, reply_markup=markup)
+
+
+@bot.message_handler(commands=['search'], func=lambda m: is_admin(m.from_user.id))
+def search_reports(message):
+    query = message.text.partition(' ')[2].strip()
+    if not query:
+        bot.send_message(
+            message.chat.id,
+            "Введите запрос после команды, например: /search клиент Ромашка\n"
+            "Слова ищутся целиком; для поиска по началу слова добавьте *: /search бюдж*"
+        )
         return
     
-    bot.send_message(
-        message.chat.id,
-        "Выберите пользователя для просмотра отчетов:",
-        reply_markup=buttons.generate_users_inline()
+    search_queries.set(message.chat.id, query)
+    text, markup = buttons.generate_search_results(query)
+    bot.send_message(message.chat.id, text, parse_mode="HTML", reply_markup=markup)
+
+@router.route('search', int)
+def show_search_page(call, page):
+    query = search_queries.get(call.message.chat.id)
+    if query is None:
+        answer(call, "Поиск устарел, повторите /search")
+        return
+    
+    text, markup = buttons.generate_search_results(query, page or 0)
+    bot.edit_message_text(
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
+        text=text,
+        parse_mode="HTML",
+        reply_markup=markup
     )
 
+@bot.message_handler(commands=['export'], func=lambda m: is_admin(m.from_user.id))
+def export_reports(message):
+    try:
+        first_day, last_day, fmt = export.parse_args(message.text)
+    except ValueError as e:
+        bot.send_message(
+            message.chat.id,
+            f"{e}\n\nПример: /export 01.10.2024 07.10.2024 csv"
+        )
+        return
+
+    # Файл собирается в фоне: обработчик сразу освобождается
+    if not export.start_export(bot, message.chat.id, first_day, last_day, fmt):
+        bot.send_message(message.chat.id, "⏳ Предыдущая выгрузка еще готовится, подождите")
+        return
+    bot.send_message(message.chat.id, "⏳ Готовлю выгрузку, файл придет отдельным сообщением")
+
+def _page_cursor(direction, cursor_id):
+    """Переводит направление листания из callback_data в курсор страницы"""
+    if direction is None:
+        return {}
+    if direction == "n":
+        return {'before_id': cursor_id}
+    return {'after_id': cursor_id}
 
 @bot.callback_query_handler(func=lambda call: True)
 def handle_inline_buttons(call):
+    """Единая точка входа для инлайн-кнопок: обработчик выбирается по коду действия"""
     try:
-        if call.data.startswith("myreport_"):
-            report_id = call.data.split("_")[1]
-            report = database.get_report_by_id(report_id)
-            
-            if not report:
-                bot.answer_callback_query(call.id, "❌ Отчет не найден")
-                return
-                
-            # Распаковываем данные отчета
-            r_id, user_id, text, date, edited_by, edited_at = report
-            date_str = date.strftime("%d.%m.%Y") if hasattr(date, 'strftime') else date
-            
-            # Формируем текст сообщения
-            message_text = f"📅 <b>Отчет от {date_str}</b>"
-            if edited_at:
-                edited_time = edited_at.strftime("%d.%m.%Y %H:%M") if hasattr(edited_at, 'strftime') else edited_at
-                message_text += f"\n✏️ <i>Редактировано: {edited_time}</i>"
-            message_text += f"\n\n{text}"
-            
-            # Показываем отчет с кнопками действий
+        if not router.dispatch(call):
+            answer(call, "Кнопка устарела, откройте меню заново")
+            return
+
+        # Всегда отвечаем на callback_query, если обработчик не ответил сам
+        if not getattr(call, 'answered', False):
+            bot.answer_callback_query(call.id)
+        
+    except Exception as e:
+        print(f"Ошибка в обработчике кнопок ({call.data}): {e}")
+        metrics.inc('errors_total', where='callback', type=type(e).__name__)
+        bot.answer_callback_query(call.id, "❌ Произошла ошибка")
+
+@router.route('my_report', int)
+def show_my_report(call, report_id):
+    report = database.get_report_by_id(report_id)
+    
+    if not report:
+        answer(call, "❌ Отчет не найден")
+        return
+        
+    # Распаковываем данные отчета
+    r_id, user_id, text, date, edited_by, edited_at = report
+    date_str = date.strftime("%d.%m.%Y") if hasattr(date, 'strftime') else date
+    
+    # Формируем текст сообщения
+    message_text = f"📅 <b>Отчет от {date_str}</b>"
+    if edited_at:
+        edited_time = edited_at.strftime("%d.%m.%Y %H:%M") if hasattr(edited_at, 'strftime') else edited_at
+        message_text += f"\n✏️ <i>Редактировано: {edited_time}</i>"
+    message_text += f"\n\n{text}"
+    
+    # Показываем отчет с кнопками действий
+    bot.edit_message_text(
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
+        text=message_text,
+        parse_mode="HTML",
+        reply_markup=buttons.generate_my_report_actions_inline(report_id)
+    )
+
+@router.route('my_reports', str, int)
+def show_my_reports_page(call, direction, cursor_id):
+    if not database.user_has_reports(call.from_user.id):
+        bot.edit_message_text(
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            text="📭 У вас пока нет сохраненных факт-отчетов."
+        )
+        return
+        
+    # Листание «◀ / ▶» меняет только клавиатуру
+    markup = buttons.generate_my_reports_inline(call.from_user.id, **_page_cursor(direction, cursor_id))
+    if direction is not None:
+        bot.edit_message_reply_markup(
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            reply_markup=markup
+        )
+        return
+        
+    bot.edit_message_text(
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
+        text="📋 Выберите факт-отчет для управления:",
+        reply_markup=markup
+    )
+
+@router.route('delete_report', int)
+def handle_delete_report(call, report_id):
+    if not database.can_edit_report(call.from_user.id, report_id):
+        answer(call, "❌ Вы не можете удалить этот отчет")
+        return
+        
+    if database.delete_report(report_id):
+        answer(call, "✅ Отчет удален")
+        
+        if database.user_has_reports(call.from_user.id):
             bot.edit_message_text(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
-                text=message_text,
-                parse_mode="HTML",
-                reply_markup=buttons.generate_my_report_actions_inline(report_id)
+                text="📋 Выберите отчет для управления:",
+                reply_markup=buttons.generate_my_reports_inline(call.from_user.id)
             )
-        
-        elif call.data == "back_to_myreports":
-            reports = database.get_user_reports(call.from_user.id)
-            if not reports:
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text="📭 У вас пока нет сохраненных факт-отчетов."
-                )
-                return
-                
+        else:
             bot.edit_message_text(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
-                text="📋 Выберите факт-отчет для управления:",
-                reply_markup=buttons.generate_my_reports_inline(call.from_user.id)
+                text="📭 У вас больше нет сохраненных отчетов."
             )
+    else:
+        answer(call, "❌ Ошибка при удалении отчета")
+
+@router.route('users', int)
+def show_users(call, page):
+    text, markup = buttons.generate_users_summary(page or 0)
+    bot.edit_message_text(
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
+        text=text,
+        reply_markup=markup
+    )
+
+@router.route('user_dates', int, str, int)
+def show_user_dates(call, user_id, direction, cursor_id):
+    markup = buttons.generate_user_dates_inline(user_id, **_page_cursor(direction, cursor_id))
+    if direction is not None:
+        bot.edit_message_reply_markup(
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            reply_markup=markup
+        )
+        return
         
-        elif call.data.startswith("edit_"):
-            report_id = call.data.split("_")[1]
-            
-            if not database.can_edit_report(call.from_user.id, report_id):
-                bot.answer_callback_query(call.id, "❌ Вы не можете редактировать этот отчет")
-                return
-                
-            report = database.get_report_by_id(report_id)
-            if not report:
-                bot.answer_callback_query(call.id, "❌ Отчет не найден")
-                return
-                
-            old_text = report[2]
-            
-            msg = bot.send_message(
-                call.message.chat.id,
-                "✏️ Введите новый текст факт-отчета:",
-                reply_markup=ForceReply(selective=True)
-            )
-            
-            bot.send_message(
-                call.message.chat.id,
-                f"📄 Текущий текст:\n\n{old_text}",
-                reply_to_message_id=msg.message_id
-            )
-            
-            bot.register_next_step_handler(msg, process_edit_report, report_id)
+    # Число отчетов и дата последнего — одна выборка по ключу из user_summary
+    summary = database.get_user_summary(user_id)
+    if summary and summary[0]:
+        report_count, last_report_date, task_count, last_task_date = summary
+        last_date = datetime.strptime(last_report_date, "%Y-%m-%d %H:%M:%S").strftime("%d.%m.%Y")
+        text = f"Отчетов: {report_count}, последний от {last_date}\nВыберите дату отчета:"
+    else:
+        text = "📭 У пользователя нет отчетов."
+    bot.edit_message_text(
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
+        text=text,
+        reply_markup=markup
+    )
+
+# Обработка задач
+@router.route('my_tasks', str, int)
+def show_my_tasks_page(call, direction, cursor_id):
+    if not database.user_has_tasks(call.from_user.id):
+        bot.edit_message_text(
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            text="У вас пока нет задач."
+        )
+        return
         
-        elif call.data.startswith("delete_"):
-            report_id = call.data.split("_")[1]
-            
-            if not database.can_edit_report(call.from_user.id, report_id):
-                bot.answer_callback_query(call.id, "❌ Вы не можете удалить этот отчет")
-                return
-                
-            if database.delete_report(report_id):
-                bot.answer_callback_query(call.id, "✅ Отчет удален")
-                
-                reports = database.get_user_reports(call.from_user.id)
-                if reports:
-                    bot.edit_message_text(
-                        chat_id=call.message.chat.id,
-                        message_id=call.message.message_id,
-                        text="📋 Выберите отчет для управления:",
-                        reply_markup=buttons.generate_my_reports_inline(call.from_user.id)
-                    )
-                else:
-                    bot.edit_message_text(
-                        chat_id=call.message.chat.id,
-                        message_id=call.message.message_id,
-                        text="📭 У вас больше нет сохраненных отчетов."
-                    )
-            else:
-                bot.answer_callback_query(call.id, "❌ Ошибка при удалении отчета")
+    markup = buttons.generate_my_tasks_inline(call.from_user.id, **_page_cursor(direction, cursor_id))
+    if direction is not None:
+        bot.edit_message_reply_markup(
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            reply_markup=markup
+        )
+        return
         
-        elif call.data == "back_to_users":
-            users = database.get_users_with_reports()
-            if not users:
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text="Нет пользователей с отчетами."
-                )
-                return
-                
-            bot.edit_message_text(
-                chat_id=call.message.chat.id,
-                message_id=call.message.message_id,
-                text="Выберите пользователя для просмотра отчетов:",
-                reply_markup=buttons.generate_users_inline()
-            )
+    bot.edit_message_text(
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
+        text="Выберите задачу:",
+        reply_markup=markup
+    )
+
+@router.route('edit_task', int)
+def handle_edit_task(call, task_id):
+    task = database.get_task_by_id(task_id)
+    
+    if not task:
+        answer(call, "❌ Задача не найдена")
+        return
+        
+    bot.send_message(
+        call.message.chat.id,
+        "✏️ Введите новый текст задачи:",
+        reply_markup=ForceReply()
+    )
+    conversations.set(call.message.chat.id, 'edit_task', task_id=task_id)
+    
+@router.route('toggle_task', int)
+def handle_toggle_task(call, task_id):
+    if database.toggle_task_status(task_id):
+        task = database.get_task_by_id(task_id)
+        status = "✅ Выполнена" if task[4] else "⏳ В процессе"
+        text = f"📌 *Задача*:\n{task[2]}\n\n{status}\n🗓 {task[3]}"
+        
+        bot.edit_message_text(
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            text=text,
+            parse_mode="Markdown",
+            reply_markup=buttons.generate_task_actions_inline(task_id)
+        )
+        answer(call, "Статус обновлен")
+    else:
+        answer(call, "❌ Ошибка обновления статуса")
+    
+@router.route('delete_task', int)
+def handle_delete_task(call, task_id):
+    if database.delete_task(task_id):
+        answer(call, "✅ Задача удалена")
         
-        elif call.data.startswith("user_"):
-            user_id = int(call.data.split("_")[1])
+        if database.user_has_tasks(call.from_user.id):
             bot.edit_message_text(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
-                text="Выберите дату отчета:",
-                reply_markup=buttons.generate_user_dates_inline(user_id)
+                text="Выберите задачу:",
+                reply_markup=buttons.generate_my_tasks_inline(call.from_user.id)
             )
-        
-        elif call.data.startswith("report_"):
-            _, user_id, report_date = call.data.split("_", 2)
-            reports = database.get_user_reports(int(user_id))
-            
-            report_info = None
-            for report in reports:
-                try:
-                    r_id, r_date, r_text, edited_at = report
-                    if str(r_date) == report_date:
-                        report_info = {
-                            'id': r_id,
-                            'text': r_text,
-                            'edited_at': edited_at
-                        }
-                        break
-                except ValueError:
-                    continue
-            
-            if report_info:
-                user = database.get_user(int(user_id))
-                user_name = user[1] if user else f"Пользователь {user_id}"
-                
-                try:
-                    formatted_date = datetime.strptime(report_date, "%Y-%m-%d %H:%M:%S").strftime("%d.%m.%Y")
-                except:
-                    formatted_date = report_date
-                
-                edited_info = ""
-                if report_info['edited_at']:
-                    edited_info = f"\n\n<i>(Отредактировано)</i>"
-                
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text=f"<b>Отчет {user_name}</b>\n"
-                         f"<i>Дата: {formatted_date}</i>\n\n"
-                         f"{report_info['text']}"
-                         f"{edited_info}",
-                    parse_mode="HTML",
-                    reply_markup=buttons.generate_report_actions_inline(
-                        int(user_id), report_info['id'], report_date)
-                )
-            else:
-                bot.answer_callback_query(call.id, "Отчет не найден")
-
-        # Обработка задач
-        elif call.data == "back_to_mytasks":
-            tasks = database.get_user_tasks(call.from_user.id)
-            if not tasks:
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text="У вас пока нет задач."
-                )
-            else:
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text="Выберите задачу:",
-                    reply_markup=buttons.generate_my_tasks_inline(call.from_user.id)
-                )
-
-        elif call.data.startswith("edittask_"):
-            task_id = call.data.split("_")[1]
-            task = database.get_task_by_id(task_id)
-            
-            if not task:
-                bot.answer_callback_query(call.id, "❌ Задача не найдена")
-                return
-                
-            msg = bot.send_message(
-                call.message.chat.id,
-                "✏️ Введите новый текст задачи:",
-                reply_markup=ForceReply()
-            )
-            bot.register_next_step_handler(msg, process_edit_task, task_id)
-            return
-            
-        elif call.data.startswith("toggletask_"):
-            task_id = call.data.split("_")[1]
-            if database.toggle_task_status(task_id):
-                task = database.get_task_by_id(task_id)
-                status = "✅ Выполнена" if task[4] else "⏳ В процессе"
-                text = f"📌 *Задача*:\n{task[2]}\n\n{status}\n🗓 {task[3]}"
-                
-                bot.edit_message_text(
-                    chat_id=call.message.chat.id,
-                    message_id=call.message.message_id,
-                    text=text,
-                    parse_mode="Markdown",
-                    reply_markup=buttons.generate_task_actions_inline(task_id)
-                )
-                bot.answer_callback_query(call.id, "Статус обновлен")
-            else:
-                bot.answer_callback_query(call.id, "❌ Ошибка обновления статуса")
-            return
-            
-        elif call.data.startswith("deletetask_"):
-            task_id = call.data.split("_")[1]
-            if database.delete_task(task_id):
-                bot.answer_callback_query(call.id, "✅ Задача удалена")
-                tasks = database.get_user_tasks(call.from_user.id)
-                
-                if tasks:
-                    bot.edit_message_text(
-                        chat_id=call.message.chat.id,
-                        message_id=call.message.message_id,
-                        text="Выберите задачу:",
-                        reply_markup=buttons.generate_my_tasks_inline(call.from_user.id)
-                    )
-                else:
-                    bot.edit_message_text(
-                        chat_id=call.message.chat.id,
-                        message_id=call.message.message_id,
-                        text="У вас больше нет задач."
-                    )
-            else:
-                bot.answer_callback_query(call.id, "❌ Ошибка удаления задачи")
-            return
-            
-        elif call.data.startswith("mytask_"):
-            task_id = call.data.split("_")[1]
-            task = database.get_task_by_id(task_id)
-            
-            if not task:
-                bot.answer_callback_query(call.id, "❌ Задача не найдена")
-                return
-
-            task_id, user_id, text, date, completed = task
-            date_str = date.strftime("%d.%m.%Y") if hasattr(date, 'strftime') else str(date)
-            status = "✅ Выполнена" if completed else "⏳ В процессе"
-
+        else:
             bot.edit_message_text(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
-                text=f"📌 *Задача:*\n{text}\n\n{status}\n🗓 {date_str}",
-                parse_mode="Markdown",
-                reply_markup=buttons.generate_task_actions_inline(task_id)
+                text="У вас больше нет задач."
             )
-            return
+    else:
+        answer(call, "❌ Ошибка удаления задачи")
+    
+@router.route('my_task', int)
+def show_my_task(call, task_id):
+    task = database.get_task_by_id(task_id)
+    
+    if not task:
+        answer(call, "❌ Задача не найдена")
+        return
 
-        # Всегда отвечаем на callback_query, если не было return раньше
-        bot.answer_callback_query(call.id)
-        
-    except Exception as e:
-        print(f"Ошибка в обработчике кнопок: {e}")
-        bot.answer_callback_query(call.id, "❌ Произошла ошибка")
+    task_id, user_id, text, date, completed = task
+    date_str = date.strftime("%d.%m.%Y") if hasattr(date, 'strftime') else str(date)
+    status = "✅ Выполнена" if completed else "⏳ В процессе"
+
+    bot.edit_message_text(
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
+        text=f"📌 *Задача:*\n{text}\n\n{status}\n🗓 {date_str}",
+        parse_mode="Markdown",
+        reply_markup=buttons.generate_task_actions_inline(task_id)
+    )
 
 def process_edit_task(message, task_id):
     try:
         # Обновляем задачу в базе данных
-        with database.get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE tasks SET task_text = ? WHERE id = ?",
-                (message.text, task_id)
-            )
-            conn.commit()
+        database.update_task(task_id, message.text)
             
         bot.send_message(
             message.chat.id,
@@ -604,62 +633,38 @@ def process_edit_task(message, task_id):
             reply_markup=buttons.get_main_keyboard()
         )
 #------------------------------------
-@bot.callback_query_handler(func=lambda call: call.data.startswith("report_"))
-def handle_report_callback(call):
+@router.route('report', int)
+def handle_report_callback(call, report_id):
     try:
-        # Разбираем callback_data: report_<user_id>_<date>
-        _, user_id, report_date = call.data.split("_", 2)
-        user_id = int(user_id)
-
-        # Получаем отчет
-        report = database.get_report_by_date(user_id, report_date)
+        # Отчет, автор и планы — одним запросом
+        report = database.get_report_detail(report_id)
         if not report:
-            bot.answer_callback_query(call.id, "Отчет не найден")
+            answer(call, "Отчет не найден")
             return
 
-        # Получаем дату отчета и предыдущий день
-        try:
-            report_datetime = datetime.strptime(report_date, "%Y-%m-%d %H:%M:%S")
-            previous_day = report_datetime - timedelta(days=1)
-            previous_day_str = previous_day.strftime("%Y-%m-%d")
-        except Exception as e:
-            print(f"Ошибка обработки даты: {e}")
-            previous_day_str = None
-
-        # Получаем задачи на предыдущий день
-        previous_day_tasks = []
-        if previous_day_str:
-            previous_day_tasks = database.get_user_tasks_by_date(user_id, previous_day_str)
-
-        # Получаем имя пользователя
-        user = database.get_user(user_id)
-        user_name = user[1] if user else f"Пользователь {user_id}"
-
-        try:
-            formatted_date = datetime.strptime(report_date, "%Y-%m-%d %H:%M:%S").strftime("%d.%m.%Y")
-        except:
-            formatted_date = report_date
+        user_id = report['user_id']
+        user_name = report['first_name'] or f"Пользователь {user_id}"
+        formatted_date = datetime.strptime(report['day'], "%Y-%m-%d").strftime("%d.%m.%Y")
 
         # Формируем сообщение
-        msg = f"<b>Отчет {user_name}</b>\n"
+        msg = f"<b>Отчет {html.escape(user_name)}</b>\n"
         msg += f"<i>Дата: {formatted_date}</i>\n\n"
-        msg += f"{report['text']}\n"
+        msg += f"{html.escape(report['text'])}\n"
 
-        # Добавляем задачи предыдущего дня, если есть
-        if previous_day_tasks:
-            msg += f"\n📌 <b>Задачи за {previous_day.strftime('%d.%m.%Y')}:</b>\n"
-            for task in previous_day_tasks:
-                _, _, task_text, is_completed, task_date = task
+        # Добавляем задачи предыдущего рабочего дня (для понедельника — пятницы), если есть
+        if report['previous_tasks']:
+            previous_day = datetime.strptime(report['previous_day'], "%Y-%m-%d").strftime("%d.%m.%Y")
+            msg += f"\n📌 <b>Задачи за {previous_day}:</b>\n"
+            for task_text, is_completed, task_date in report['previous_tasks']:
                 status = "✅" if is_completed else "⏳"
-                msg += f"{status} {task_text}\n"
+                msg += f"{status} {html.escape(task_text)}\n"
 
         # Добавляем последнюю задачу
-        last_task = database.get_last_user_task(user_id)
-        if last_task:
-            task_text, task_date, is_completed = last_task
+        if report['last_task']:
+            task_text, task_date, is_completed = report['last_task']
             task_date_str = task_date.strftime("%d.%m.%Y") if hasattr(task_date, 'strftime') else str(task_date)
             status = "✅" if is_completed else "⏳"
-            msg += f"\n🗓 <b>Последний План-отчет:</b>\n{status} {task_text}\n📅 {task_date_str}\n"
+            msg += f"\n🗓 <b>Последний План-отчет:</b>\n{status} {html.escape(task_text)}\n📅 {task_date_str}\n"
 
         # Обновляем сообщение
         bot.edit_message_text(
@@ -667,18 +672,17 @@ def handle_report_callback(call):
             message_id=call.message.message_id,
             text=msg,
             parse_mode="HTML",
-            reply_markup=buttons.generate_report_actions_inline(user_id, report['id'], report_date)
+            reply_markup=buttons.generate_report_actions_inline(user_id, report['id'])
         )
 
     except Exception as e:
         print(f"Ошибка в handle_report_callback: {e}")
-        bot.answer_callback_query(call.id, "Ошибка загрузки отчета")
+        answer(call, "Ошибка загрузки отчета")
 
 #--------------------------------------------
 @bot.message_handler(func=lambda m: m.text == "Мои План-отчеты")
 def show_my_tasks(message):
-    tasks = database.get_user_tasks(message.from_user.id)
-    if not tasks:
+    if not database.user_has_tasks(message.from_user.id):
         bot.send_message(
             message.chat.id,
             "У вас пока нет задач.",
@@ -694,16 +698,17 @@ def show_my_tasks(message):
 
 @bot.message_handler(func=lambda m: m.text == "Начать План-отчет")
 def handle_add_task(message):
-    msg = bot.send_message(
+    bot.send_message(
         message.chat.id,
         "📝Введите текст План-отчета с задачами на следующий рабочий день:",
         reply_markup=ForceReply()
     )
-    bot.register_next_step_handler(msg, process_add_task)
+    conversations.set(message.chat.id, 'add_task')
 
 def process_add_task(message):
     try:
         task_id = database.add_task(message.from_user.id, message.text)
+        metrics.inc('tasks_saved_total')
         bot.send_message(
             message.chat.id,
             "✅Задачи успешно добавлены!",
@@ -711,8 +716,17 @@ def process_add_task(message):
         )
     except Exception as e:
         print(f"Ошибка добавления задачи: {e}")
+        metrics.inc('errors_total', where='process_add_task', type=type(e).__name__)
         bot.send_message(
             message.chat.id,
             "❌ Не удалось добавить задачу",
             reply_markup=buttons.get_main_keyboard()
         )
+
+# Шаги диалогов: состояние -> обработчик следующего сообщения
+CONVERSATION_STEPS = {
+    'report': save_report,
+    'add_task': process_add_task,
+    'edit_report': process_edit_report,
+    'edit_task': process_edit_task,
+}
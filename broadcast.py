@@ -0,0 +1,126 @@
+"""Рассылка сообщений множеству чатов с соблюдением лимитов Telegram.
+
+Сообщения отправляет пул потоков. Общий поток ограничивает TokenBucket
+(Telegram допускает около 30 сообщений в секунду на бота), а в один чат
+пишем не чаще раза в BROADCAST_CHAT_INTERVAL секунд. На ответ 429 вся
+рассылка ждет retry_after и повторяет сообщение.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from telebot.apihelper import ApiTelegramException
+
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))  # Сообщений в секунду на бота
+BROADCAST_CHAT_INTERVAL = float(os.getenv("BROADCAST_CHAT_INTERVAL", "1"))  # Секунд между сообщениями в один чат
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+
+class TokenBucket:
+    """Потокобезопасное ведро токенов: rate токенов в секунду, не больше capacity в запасе
+
+    По умолчанию запас — один токен, то есть отправка равномерная, без всплесков."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else 1.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Блокирует поток, пока не освободится токен"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Останавливает выдачу токенов на seconds секунд (ответ 429 от Telegram)"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+class ChatLimiter:
+    """Выдерживает минимальный интервал между сообщениями в один чат"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_allowed = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, chat_id):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_allowed.get(chat_id, 0.0))
+            self.next_allowed[chat_id] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+def retry_after(error):
+    """Возвращает retry_after из ответа 429 или None для остальных ошибок"""
+    if isinstance(error, ApiTelegramException) and error.error_code == 429:
+        parameters = (error.result_json or {}).get('parameters') or {}
+        return parameters.get('retry_after', 1)
+    return None
+
+def broadcast(bot, messages, workers=BROADCAST_WORKERS, rate=BROADCAST_RATE,
+              chat_interval=BROADCAST_CHAT_INTERVAL, max_retries=BROADCAST_MAX_RETRIES,
+              on_result=None, name="Рассылка"):
+    """Отправляет сообщения пулом потоков и возвращает сводку.
+
+    messages — итерируемое из (chat_id, text) или (chat_id, text, kwargs для send_message).
+    on_result(chat_id, error) вызывается после каждой отправки; error — None при успехе.
+    Сводка: {'sent', 'failed', 'retried', 'duration', 'errors': {chat_id: текст ошибки}}."""
+    bucket = TokenBucket(rate)
+    chats = ChatLimiter(chat_interval)
+    summary = {'sent': 0, 'failed': 0, 'retried': 0, 'duration': 0.0, 'errors': {}}
+    summary_lock = threading.Lock()
+    started = time.monotonic()
+
+    def send(message):
+        chat_id, text = message[0], message[1]
+        kwargs = message[2] if len(message) > 2 else {}
+        error = None
+        for attempt in range(max_retries + 1):
+            chats.acquire(chat_id)
+            bucket.acquire()
+            try:
+                bot.send_message(chat_id, text, **kwargs)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                wait = retry_after(e)
+                if wait is None or attempt == max_retries:
+                    break
+                bucket.pause(wait)
+                with summary_lock:
+                    summary['retried'] += 1
+        with summary_lock:
+            if error is None:
+                summary['sent'] += 1
+            else:
+                summary['failed'] += 1
+                summary['errors'][chat_id] = str(error)
+        if on_result:
+            on_result(chat_id, error)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="broadcast") as pool:
+        for message in messages:
+            pool.submit(send, message)
+
+    summary['duration'] = time.monotonic() - started
+    print(f"{name}: отправлено {summary['sent']}, ошибок {summary['failed']}, "
+          f"повторов {summary['retried']}, за {summary['duration']:.1f} с")
+    return summary
@@ -1,17 +1,64 @@
 from telebot import types
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+import html
+import json
 import os
+import re
+import callbacks
 import database
 from datetime import datetime
-import bot
+import config
+
+class CachedMarkup(types.JsonSerializable):
+    """Клавиатура с готовым JSON.
+
+    telebot сериализует reply_markup вызовом to_json() при каждой отправке;
+    здесь строка собрана заранее, поэтому отправка ее только подставляет.
+    Объект неизменяемый и может отдаваться во все сообщения сразу."""
+
+    def __init__(self, json_text):
+        self.json_text = json_text
+
+    @classmethod
+    def from_markup(cls, markup):
+        return cls(markup.to_json())
+
+    def to_json(self):
+        return self.json_text
+
+    def to_dict(self):
+        return json.loads(self.json_text)
+
+class KeyboardTemplate:
+    """Инлайн-клавиатура, в которой от сообщения к сообщению меняются только id.
+
+    build(**поля) строит разметку один раз с метками '{поле}' вместо id;
+    ее JSON режется по меткам на куски, и render() получает готовую
+    CachedMarkup склейкой кусков с числами, без объектов кнопок и json.dumps."""
+
+    def __init__(self, build, *fields):
+        json_text = build(**{field: "{%s}" % field for field in fields}).to_json()
+        # Куски на четных местах — текст JSON, на нечетных — имена полей
+        self.parts = re.split("{(%s)}" % "|".join(fields), json_text)
+        missing = set(fields) - set(self.parts[1::2])
+        if missing:
+            raise ValueError(f"Поля {', '.join(sorted(missing))} не встречаются в клавиатуре")
+        self.slots = [(index, self.parts[index]) for index in range(1, len(self.parts), 2)]
+
+    def render(self, **values):
+        parts = self.parts[:]
+        for index, field in self.slots:
+            # int() не пропустит в JSON кавычки и разделители callback_data
+            parts[index] = str(int(values[field]))
+        return CachedMarkup("".join(parts))
 
 def get_user_keyboard(user_id=None):     #Возвращает клавиатуру в зависимости от роли пользователя
 
-    if user_id is not None and is_admin(user_id):
+    if user_id is not None and config.is_admin(user_id):
         return get_admin_keyboard()
     return get_main_keyboard()
 
-def get_main_keyboard():
+def _build_main_keyboard():
     keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
     
     btn_report = types.KeyboardButton("Начать Факт-отчет")
@@ -26,7 +73,7 @@ def get_main_keyboard():
     
     return keyboard
 
-def get_admin_keyboard():   # Клавиатура для администратора
+def _build_admin_keyboard():   # Клавиатура для администратора
     keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
     
     btn_view_reports = types.KeyboardButton("Просмотреть отчеты")
@@ -35,207 +82,285 @@ def get_admin_keyboard():   # Клавиатура для администрат
     keyboard.add(btn_view_reports)
     keyboard.add(btn_rule_admin)    
     return keyboard
+
+# Постоянные клавиатуры одинаковы для всех сообщений — собираем их один раз
+MAIN_KEYBOARD = CachedMarkup.from_markup(_build_main_keyboard())
+ADMIN_KEYBOARD = CachedMarkup.from_markup(_build_admin_keyboard())
+
+def get_main_keyboard():
+    return MAIN_KEYBOARD
+
+def get_admin_keyboard():
+    return ADMIN_KEYBOARD
     
-def generate_my_reports_inline(user_id):
-    """Генерирует инлайн-кнопки с отчетами пользователя для управления"""
-    markup = types.InlineKeyboardMarkup()
-    reports = database.get_user_reports(user_id)
+def _add_page_buttons(markup, action, args, rows, has_more, before_id=None, after_id=None):
+    """Добавляет ряд «◀ / ▶» для постраничного списка.
+
+    Кнопки несут направление и курсор — id крайней строки страницы:
+    «◀» — первой, «▶» — последней; args — аргументы действия перед ними."""
+    if after_id is not None:
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = before_id is not None, has_more
     
-    if not reports:
-        return markup
+    nav = []
+    if has_prev:
+        nav.append(types.InlineKeyboardButton(text="◀", callback_data=callbacks.encode(action, *args, "p", rows[0][0])))
+    if has_next:
+        nav.append(types.InlineKeyboardButton(text="▶", callback_data=callbacks.encode(action, *args, "n", rows[-1][0])))
+    if nav:
+        markup.row(*nav)
+
+def _load_page(load_page, user_id, before_id=None, after_id=None):
+    """Загружает страницу; если строка-курсор удалена, возвращает первую страницу"""
+    rows, has_more = load_page(user_id, before_id=before_id, after_id=after_id)
+    if not rows and (before_id is not None or after_id is not None):
+        return load_page(user_id) + (None, None)
+    return rows, has_more, before_id, after_id
+
+def generate_my_reports_inline(user_id, before_id=None, after_id=None):
+    """Генерирует инлайн-кнопки с отчетами пользователя для управления (постранично)"""
+    markup = types.InlineKeyboardMarkup()
+    reports, has_more, before_id, after_id = _load_page(
+        database.get_user_reports_page, user_id, before_id, after_id)
     
-    for report in reports[:10]:  # Показываем последние 10 отчетов
+    for report in reports:
         try:
-            report_id, date, text, edited_at = report
+            report_id, date, edited_at = report
             date_str = date.strftime("%d.%m.%Y") if hasattr(date, 'strftime') else date
             btn_text = f"{date_str} ({'ред.' if edited_at else 'нов.'})"
             
             markup.add(
                 types.InlineKeyboardButton(
                     text=btn_text,
-                    callback_data=f"myreport_{report_id}"
+                    callback_data=callbacks.encode('my_report', report_id)
                 )
             )
         except Exception as e:
             print(f"Ошибка обработки отчета: {e}")
             continue
     
+    _add_page_buttons(markup, 'my_reports', (), reports, has_more, before_id, after_id)
     return markup
     
-def generate_my_report_actions_inline(report_id):
-    """Генерирует кнопки действий с отчетом (редактирование/удаление)"""
+def _build_my_report_actions(report_id):
     markup = types.InlineKeyboardMarkup()
     
     markup.row(
         types.InlineKeyboardButton(
             text="✏️ Редактировать",
-            callback_data=f"edit_{report_id}"
+            callback_data=callbacks.encode('edit_report', report_id)
         ),
         types.InlineKeyboardButton(
             text="🗑 Удалить",
-            callback_data=f"delete_{report_id}"
+            callback_data=callbacks.encode('delete_report', report_id)
         )
     )
     
     markup.row(
         types.InlineKeyboardButton(
             text="◀️ Назад к списку",
-            callback_data="back_to_myreports"
+            callback_data=callbacks.encode('my_reports')
         )
     )
     
     return markup
 
-def generate_users_inline():
-    """Генерирует инлайн-кнопки с пользователями и статусом отчетов"""
+_MY_REPORT_ACTIONS = KeyboardTemplate(_build_my_report_actions, 'report_id')
+
+def generate_my_report_actions_inline(report_id):
+    """Генерирует кнопки действий с отчетом (редактирование/удаление)"""
+    return _MY_REPORT_ACTIONS.render(report_id=report_id)
+
+def generate_users_summary(page=0):
+    """Сводка сдачи отчетов за рабочий день и страница пользователей со статусами.
+
+    Возвращает (текст, клавиатура); сначала идут те, кто еще не сдал отчеты"""
     markup = types.InlineKeyboardMarkup()
-    users = database.get_users_with_reports()
+    page_size = database.COMPLIANCE_PAGE_SIZE
+    users, totals = database.get_daily_compliance(
+        exclude_ids=config.ADMIN_IDS, limit=page_size, offset=page * page_size)
+    if not users and page:
+        # Страница опустела (например, пользователей стало меньше) — показываем первую
+        page = 0
+        users, totals = database.get_daily_compliance(exclude_ids=config.ADMIN_IDS, limit=page_size)
     
     if not users:
-        return markup
+        return "Нет пользователей для проверки отчетов.", markup
     
-    for user_id, first_name, username in users:
-        # Проверяем наличие отчета за последние 12 часов
-        has_report = database.has_recent_report(user_id)
-        status_icon = "✅" if has_report else "❌"
-        
+    for user_id, first_name, username, has_fact, has_plan in users:
         display_name = username or first_name or f"User {user_id}"
         
         markup.add(
             types.InlineKeyboardButton(
-                text=f"{display_name} {status_icon}",
-                callback_data=f"user_{user_id}"
+                text=f"{display_name} Ф{'✅' if has_fact else '❌'} П{'✅' if has_plan else '❌'}",
+                callback_data=callbacks.encode('user_dates', user_id)
             )
         )
     
-    return markup
+    nav = []
+    if page > 0:
+        nav.append(types.InlineKeyboardButton(text="◀", callback_data=callbacks.encode('users', page - 1)))
+    if (page + 1) * page_size < totals['users']:
+        nav.append(types.InlineKeyboardButton(text="▶", callback_data=callbacks.encode('users', page + 1)))
+    if nav:
+        markup.row(*nav)
+    
+    day = datetime.strptime(totals['day'], "%Y-%m-%d").strftime("%d.%m.%Y")
+    text = (
+        f"📊 Отчеты за {day}\n"
+        f"Факт-отчеты: {totals['fact']}/{totals['users']}, План-отчеты: {totals['plan']}/{totals['users']}\n\n"
+        "Выберите пользователя для просмотра отчетов:"
+    )
+    return text, markup
     
-def generate_user_dates_inline(user_id):
-    """Генерирует инлайн-кнопки с датами отчетов пользователя"""
+SEARCH_KINDS = {
+    'report': "📄 Факт-отчет",
+    'task': "🗓 План-отчет",
+    'history': "✏️ Прежняя версия отчета",
+}
+
+def generate_search_results(query, page=0):
+    """Страница результатов поиска: (текст в HTML, клавиатура)"""
     markup = types.InlineKeyboardMarkup()
-    reports = database.get_user_reports(user_id)
+    page_size = database.SEARCH_PAGE_SIZE
+    rows, has_more = database.search(query, limit=page_size, offset=page * page_size)
     
-    if not reports:
-        return markup
+    if not rows:
+        return f"🔍 По запросу «{html.escape(query)}» ничего не найдено.", markup
+    
+    lines = [f"🔍 <b>Результаты по запросу «{html.escape(query)}»</b>"]
+    for number, (kind, row_id, user_id, date, fragment) in enumerate(rows, page * page_size + 1):
+        user = database.get_user(user_id)
+        user_name = (user[1] or user[2]) if user else f"User {user_id}"
+        formatted_date = str(date)[:10]
+        try:
+            formatted_date = datetime.strptime(str(date), "%Y-%m-%d %H:%M:%S").strftime("%d.%m.%Y")
+        except ValueError:
+            pass
+        # Экранируем текст отчета, затем превращаем метки совпадений в <b>
+        fragment = html.escape(fragment).replace(database.SEARCH_MARK[0], "<b>").replace(database.SEARCH_MARK[1], "</b>")
+        lines.append(f"\n{number}. {SEARCH_KINDS[kind]} — {html.escape(str(user_name))}, {formatted_date}\n{fragment}")
+        
+        if kind == 'report':
+            markup.add(
+                types.InlineKeyboardButton(
+                    text=f"{number}. Открыть отчет {user_name}, {formatted_date}",
+                    callback_data=callbacks.encode('report', row_id)
+                )
+            )
+    
+    nav = []
+    if page > 0:
+        nav.append(types.InlineKeyboardButton(text="◀", callback_data=callbacks.encode('search', page - 1)))
+    if has_more:
+        nav.append(types.InlineKeyboardButton(text="▶", callback_data=callbacks.encode('search', page + 1)))
+    if nav:
+        markup.row(*nav)
+    
+    return "\n".join(lines), markup
+
+def generate_user_dates_inline(user_id, before_id=None, after_id=None):
+    """Генерирует инлайн-кнопки с датами отчетов пользователя (постранично)"""
+    markup = types.InlineKeyboardMarkup()
+    reports, has_more, before_id, after_id = _load_page(
+        database.get_user_reports_page, user_id, before_id, after_id)
     
     for report in reports:
         try:
-            report_id, report_date, report_text, edited_at = report
-            # Преобразуем дату в строку, если это datetime
-            date_str = report_date.strftime("%Y-%m-%d %H:%M:%S") if hasattr(report_date, 'strftime') else str(report_date)
+            report_id, report_date, edited_at = report
             formatted_date = report_date.strftime("%d.%m.%Y") if hasattr(report_date, 'strftime') else report_date
             
             markup.add(
                 types.InlineKeyboardButton(
                     text=formatted_date,
-                    callback_data=f"report_{user_id}_{date_str}"
+                    callback_data=callbacks.encode('report', report_id)
                 )
             )
         except Exception as e:
             print(f"Ошибка обработки отчета: {e}")
             continue
     
+    _add_page_buttons(markup, 'user_dates', (user_id,), reports, has_more, before_id, after_id)
     markup.add(
         types.InlineKeyboardButton(
             text="◀️ Назад к списку пользователей",
-            callback_data="back_to_users"
+            callback_data=callbacks.encode('users')
         )
     )
     
     return markup
 
-def generate_report_actions_inline(user_id, report_id, report_date):
-    """Генерирует кнопки действий с отчетом"""
+def _build_report_actions(user_id, report_id):
     markup = types.InlineKeyboardMarkup()
     
-    # Получаем информацию о том, кто сейчас работает с отчетом (не автора отчета!)
-    current_user_is_admin = user_id in bot.ADMIN_IDS if hasattr(bot, 'ADMIN_IDS') else False
-    
     markup.row(
         types.InlineKeyboardButton(
             text="✏️ Дать комментарий",
-            callback_data=f"edit_{report_id}"
+            callback_data=callbacks.encode('edit_report', report_id)
         ),
         types.InlineKeyboardButton(
             text="🗑 Удалить",
-            callback_data=f"delete_{report_id}"
+            callback_data=callbacks.encode('delete_report', report_id)
         )
     )
     
     markup.row(
         types.InlineKeyboardButton(
             text="◀️ Назад к отчетам",
-            callback_data=f"user_{user_id}"
+            callback_data=callbacks.encode('user_dates', user_id)
         )
     )
     
     return markup
 
-def process_edit_report(message, report_id):
-    try:
-        # Обновляем отчет в базе данных
-        success = database.update_report(
-            report_id=report_id,
-            new_text=message.text,
-            editor_id=message.from_user.id
-        )
-        
-        if success:
-            bot.send_message(
-                message.chat.id,
-                "✅ Отчет успешно обновлен!",
-                reply_markup=buttons.get_main_keyboard()
-            )
-        else:
-            bot.send_message(
-                message.chat.id,
-                "❌ Не удалось обновить отчет",
-                reply_markup=buttons.get_main_keyboard()
-            )
-    except Exception as e:
-        print(f"Ошибка при редактировании отчета: {e}")
-        bot.send_message(
-            message.chat.id,
-            "❌ Произошла ошибка при обновлении отчета",
-            reply_markup=buttons.get_main_keyboard()
-        )
+_REPORT_ACTIONS = KeyboardTemplate(_build_report_actions, 'user_id', 'report_id')
 
-from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+def generate_report_actions_inline(user_id, report_id):
+    """Генерирует кнопки действий с отчетом"""
+    return _REPORT_ACTIONS.render(user_id=user_id, report_id=report_id)
 
-def generate_my_tasks_inline(user_id):
-    """Генерирует инлайн-кнопки с задачами пользователя"""
+def generate_my_tasks_inline(user_id, before_id=None, after_id=None):
+    """Генерирует инлайн-кнопки с задачами пользователя (постранично)"""
     markup = InlineKeyboardMarkup()
-    tasks = database.get_user_tasks(user_id)
+    tasks, has_more, before_id, after_id = _load_page(
+        database.get_user_tasks_page, user_id, before_id, after_id)
     
     if not tasks:
         return markup
     
-    for task in tasks[:10]:  # Показываем последние 10 задач
+    for task in tasks:
         try:
-            task_id, text, date, completed = task  # Теперь 4 значения вместо 5
+            task_id, date, completed = task
             date_str = date.strftime("%d.%m.%Y") if hasattr(date, 'strftime') else str(date)
             btn_text = f"{'✅' if completed else '🟡'} {date_str}"
             
             markup.add(
                 InlineKeyboardButton(
                     text=btn_text,
-                    callback_data=f"mytask_{task_id}"
+                    callback_data=callbacks.encode('my_task', task_id)
                 )
             )
         except Exception as e:
             print(f"Ошибка обработки задачи: {e}")
             continue
     
+    _add_page_buttons(markup, 'my_tasks', (), tasks, has_more, before_id, after_id)
     return markup
 
-def generate_task_actions_inline(task_id):
+def _build_task_actions(task_id):
     markup = InlineKeyboardMarkup()
     markup.row(
-        InlineKeyboardButton("✏️ Редактировать", callback_data=f"edittask_{task_id}"),
-        InlineKeyboardButton("✅ Переключить статус", callback_data=f"toggletask_{task_id}")
+        InlineKeyboardButton("✏️ Редактировать", callback_data=callbacks.encode('edit_task', task_id)),
+        InlineKeyboardButton("✅ Переключить статус", callback_data=callbacks.encode('toggle_task', task_id))
     )
     markup.row(
-        InlineKeyboardButton("🗑 Удалить", callback_data=f"deletetask_{task_id}"),
-        InlineKeyboardButton("◀️ Назад", callback_data="back_to_mytasks")
+        InlineKeyboardButton("🗑 Удалить", callback_data=callbacks.encode('delete_task', task_id)),
+        InlineKeyboardButton("◀️ Назад", callback_data=callbacks.encode('my_tasks'))
     )
     return markup
+
+_TASK_ACTIONS = KeyboardTemplate(_build_task_actions, 'task_id')
+
+def generate_task_actions_inline(task_id):
+    return _TASK_ACTIONS.render(task_id=task_id)
@@ -0,0 +1,62 @@
+"""Простой потокобезопасный LRU-кэш с временем жизни записей и счетчиками попаданий."""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class TTLCache:
+    """LRU-кэш: не больше maxsize записей, каждая живет ttl секунд (None — без срока)"""
+
+    def __init__(self, maxsize=1024, ttl=None, name="cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self.data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.data[key] = (value, expires)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def get_or_load(self, key, load):
+        """Возвращает значение из кэша или загружает его через load() и запоминает.
+
+        None тоже кэшируется, чтобы повторные запросы несуществующих записей
+        не ходили в базу; запись, созданную позже, нужно инвалидировать."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = load()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.data), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,92 @@
+"""Кодек callback_data и маршрутизатор callback-запросов инлайн-кнопок.
+
+callback_data имеет вид '<версия><код действия>[:арг1[:арг2...]]', например
+'1r:1520' — открыть свой отчет 1520. Коды действий — один символ, поэтому
+данные кнопки укладываются в лимит Telegram в 64 байта. Обработчик
+выбирается по коду поиском в словаре, без перебора префиксов.
+Кнопки со старой версией или старым форматом распознаются как устаревшие.
+"""
+
+VERSION = '1'
+MAX_LENGTH = 64  # Ограничение Telegram на callback_data в байтах
+SEPARATOR = ':'
+
+# Имя действия -> код в callback_data. Коды нельзя менять без смены VERSION
+ACTIONS = {
+    'my_reports': 'R',     # [направление, курсор] — список своих отчетов
+    'my_report': 'r',      # report_id — просмотр своего отчета
+    'edit_report': 'e',    # report_id
+    'delete_report': 'd',  # report_id
+    'users': 'U',          # список пользователей (админ)
+    'user_dates': 'u',     # user_id, [направление, курсор] — даты отчетов пользователя
+    'report': 'o',         # report_id — просмотр отчета админом ('v' с user_id и датой упразднен)
+    'my_tasks': 'T',       # [направление, курсор] — список своих задач
+    'my_task': 't',        # task_id
+    'edit_task': 'E',      # task_id
+    'toggle_task': 'g',    # task_id
+    'delete_task': 'x',    # task_id
+    'search': 's',         # страница — результаты /search (запрос хранится у бота)
+}
+
+def encode(action, *args):
+    """Кодирует действие и аргументы в callback_data"""
+    data = VERSION + ACTIONS[action]
+    if args:
+        data += SEPARATOR + SEPARATOR.join(str(arg) for arg in args)
+    if len(data.encode()) > MAX_LENGTH:
+        raise ValueError(f"callback_data длиннее {MAX_LENGTH} байт: {data}")
+    return data
+
+class CallbackRouter:
+    """Сопоставляет коды действий с обработчиками handler(call, *args)"""
+
+    def __init__(self):
+        self.routes = {}
+
+    def route(self, action, *arg_types):
+        """Декоратор: регистрирует обработчик действия.
+
+        arg_types — функции разбора аргументов (int, str, ...). Последний
+        аргумент забирает остаток строки, поэтому может содержать ':'.
+        Недостающие аргументы передаются как None."""
+        key = VERSION + ACTIONS[action]
+        parse_args = _args_parser(arg_types)
+
+        def decorator(handler):
+            if key in self.routes:
+                raise ValueError(f"Действие {action} уже зарегистрировано")
+            self.routes[key] = (handler, parse_args)
+            return handler
+        return decorator
+
+    def dispatch(self, call):
+        """Вызывает обработчик для call.data; False — если маршрут не найден"""
+        # Ключ маршрута — версия и код вместе, поэтому кнопки другой версии не найдутся
+        head, _, rest = (call.data or '').partition(SEPARATOR)
+        route = self.routes.get(head)
+        if route is None:
+            return False
+        handler, parse_args = route
+        handler(call, *parse_args(rest))
+        return True
+
+def _args_parser(arg_types):
+    """Строит функцию разбора строки аргументов для маршрута"""
+    count = len(arg_types)
+    # Для str разбор не нужен: значение уже строка
+    parsers = [None if parse is str else parse for parse in arg_types]
+    if count == 0:
+        return lambda rest: ()
+    if count == 1:
+        parse = parsers[0] or str
+        return lambda rest: (parse(rest),) if rest else (None,)
+
+    def parse_args(rest):
+        raw = rest.split(SEPARATOR, count - 1) if rest else []
+        if len(raw) < count:
+            raw += [None] * (count - len(raw))
+        for index, parse in enumerate(parsers):
+            if parse is not None and raw[index] is not None:
+                raw[index] = parse(raw[index])
+        return raw
+    return parse_args
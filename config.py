@@ -0,0 +1,19 @@
+"""Общие настройки бота из окружения (и файла .env).
+
+Модуль ничего не импортирует из проекта, поэтому database, buttons и
+остальные модули берут отсюда список админов и путь к базе, не импортируя
+bot и не создавая TeleBot.
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+# Адрес Bot API, например http://127.0.0.1:8081/bot{0}/{1} для локальной заглушки
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+ADMIN_IDS = [int(admin_id) for admin_id in os.getenv("ADMIN_IDS", "").split(',') if admin_id.strip()]
+DB_NAME = os.getenv("DB_NAME", "telegram_bot.db")
+
+def is_admin(user_id):
+    return user_id in ADMIN_IDS
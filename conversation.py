@@ -0,0 +1,52 @@
+"""Хранилище состояния диалогов вместо register_next_step_handler.
+
+Состояние чата (например, «ждем текст Факт-отчета») хранится в таблице
+conversation_state и поэтому переживает перезапуск бота. Поверх таблицы
+работает ограниченный LRU-кэш, в том числе для чатов без диалога, чтобы
+обычные сообщения не ходили в базу. Диалоги старше CONVERSATION_TTL
+считаются брошенными: они не возвращаются и удаляются при очистке.
+"""
+import json
+import os
+import time
+import cache
+import database
+
+CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL", str(12 * 3600)))  # Секунд до истечения диалога
+CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", "4096"))
+
+_NONE = ('', None)  # Запись кэша «у чата нет диалога»
+
+class ConversationStore:
+    """Состояние диалогов: SQLite + кэш в памяти с истечением по TTL"""
+
+    def __init__(self, ttl=CONVERSATION_TTL, cache_size=CONVERSATION_CACHE_SIZE):
+        self.ttl = ttl
+        self.hot = cache.TTLCache(cache_size, ttl, name="conversations")
+
+    def get(self, chat_id):
+        """Возвращает (state, payload) или None, если диалога нет"""
+        entry = self.hot.get(chat_id)
+        if entry is None:
+            row = database.get_conversation_state(chat_id, time.time() - self.ttl)
+            entry = (row[0], json.loads(row[1]) if row[1] else {}) if row else _NONE
+            self.hot.set(chat_id, entry)
+        return None if entry is _NONE else entry
+
+    def set(self, chat_id, state, **payload):
+        """Переводит чат в состояние state; payload — параметры шага (id отчета и т.п.)"""
+        database.set_conversation_state(
+            chat_id, state, json.dumps(payload) if payload else None, time.time())
+        self.hot.set(chat_id, (state, payload))
+
+    def pop(self, chat_id):
+        """Возвращает текущее состояние и завершает диалог"""
+        entry = self.get(chat_id)
+        if entry is not None:
+            database.clear_conversation_state(chat_id)
+            self.hot.set(chat_id, _NONE)
+        return entry
+
+    def purge_expired(self):
+        """Удаляет брошенные диалоги из базы; возвращает их число"""
+        return database.purge_conversation_states(time.time() - self.ttl)
@@ -1,74 +1,114 @@
 import sqlite3
+import json
+import math
 import os
-from dotenv import load_dotenv
-import bot
-from datetime import datetime  # Добавьте в начало файла
+import re
+import threading
+import weakref
+from difflib import SequenceMatcher
+from contextlib import contextmanager
+import cache
+import config
+import pytz
+from datetime import datetime, timedelta  # Добавьте в начало файла
 
-load_dotenv()
+DB_NAME = config.DB_NAME
 
-DB_NAME = os.getenv("DB_NAME", "telegram_bot.db")
+# Настройки соединений: размер кэша страниц (в КБ) и объем mmap (в байтах)
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "10"))
+
+# Пул соединений: по одному долгоживущему соединению на поток для чтения
+# и одно общее соединение для записи, защищенное блокировкой.
+# Соединение потока закрывается, когда поток завершается
+_local = threading.local()
+_generation = 0
+_writer = None
+_writer_lock = threading.RLock()
+_connections = weakref.WeakSet()  # _ThreadConnection живых потоков
+_connections_lock = threading.Lock()
+
+# Кэш профилей пользователей и владельцев отчетов (id отчета -> user_id)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "4096"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "600"))
+_user_cache = cache.TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL, name="users")
+_report_owner_cache = cache.TTLCache(USER_CACHE_SIZE * 4, USER_CACHE_TTL, name="report_owners")
+
+def _connect(check_same_thread=True):
+    """Открывает соединение и один раз настраивает его через PRAGMA"""
+    conn = sqlite3.connect(DB_NAME, timeout=DB_BUSY_TIMEOUT, check_same_thread=check_same_thread)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{DB_CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+class _ThreadConnection:
+    """Соединение для чтения, принадлежащее одному потоку.
+
+    Объект хранится только в _local: когда поток завершается, Python очищает
+    его данные в _local, и финализатор закрывает соединение. Закрытие может
+    произойти в другом потоке, поэтому check_same_thread выключен."""
+
+    def __init__(self):
+        self.conn = _connect(check_same_thread=False)
+        self.generation = _generation
+        self.close = weakref.finalize(self, self.conn.close)
 
 def get_db_connection():
-    return sqlite3.connect(DB_NAME)
+    """Возвращает соединение текущего потока (создается при первом обращении)"""
+    holder = getattr(_local, 'holder', None)
+    if holder is None or holder.generation != _generation:
+        if holder is not None:
+            holder.close()
+        holder = _local.holder = _ThreadConnection()
+        with _connections_lock:
+            _connections.add(holder)
+    return holder.conn
+
+def release_connection():
+    """Закрывает соединение текущего потока; следующее обращение откроет новое"""
+    holder = getattr(_local, 'holder', None)
+    if holder is not None:
+        _local.holder = None
+        holder.close()
+
+@contextmanager
+def get_write_connection():
+    """Выдает общее соединение для записи; коммитит при выходе, откатывает при ошибке"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = _connect(check_same_thread=False)
+        try:
+            yield _writer
+            _writer.commit()
+        except BaseException:
+            _writer.rollback()
+            raise
+
+def close_all_connections():
+    """Закрывает все соединения пула (при остановке бота или смене DB_NAME)"""
+    global _writer, _generation
+    with _writer_lock, _connections_lock:
+        for holder in list(_connections):
+            try:
+                holder.close()
+            except sqlite3.Error:
+                pass
+        _connections.clear()
+        if _writer is not None:
+            try:
+                _writer.close()
+            except sqlite3.Error:
+                pass
+        _writer = None
+        _generation += 1
 
-def init_db():
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        
-        # Таблица пользователей
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                first_name TEXT,
-                username TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Обновленная таблица отчетов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                report_text TEXT,
-                report_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                edited_by INTEGER DEFAULT NULL,
-                edited_at TIMESTAMP DEFAULT NULL,
-                FOREIGN KEY(user_id) REFERENCES users(user_id)
-            )
-        ''')
-        conn.commit()
-        
-        
-        # Таблица задач
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                task_text TEXT,
-                task_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_completed BOOLEAN DEFAULT FALSE,
-                FOREIGN KEY(user_id) REFERENCES users(user_id)
-            )
-        ''')
-        conn.commit()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS report_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                original_id INTEGER,
-                user_id INTEGER,
-                report_text TEXT,
-                report_date TIMESTAMP,
-                edited_by INTEGER,
-                edited_at TIMESTAMP,
-                FOREIGN KEY(user_id) REFERENCES users(user_id)
-            )
-        ''')
-        conn.commit()
-        
 def add_task(user_id, task_text):
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
             '''INSERT INTO tasks (user_id, task_text) 
@@ -78,6 +118,16 @@ def add_task(user_id, task_text):
         conn.commit()
         return cursor.lastrowid
 
+def update_task(task_id, task_text):
+    """Обновляет текст задачи"""
+    with get_write_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE tasks SET task_text = ? WHERE id = ?",
+            (task_text, task_id)
+        )
+        return cursor.rowcount > 0
+
 def get_user_tasks(user_id):
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -91,7 +141,7 @@ def get_user_tasks(user_id):
         
 def delete_task(task_id):
     """Удаляет задачу по ID"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         try:
             cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
@@ -101,118 +151,392 @@ def delete_task(task_id):
             print(f"Ошибка удаления задачи: {e}")
             return False
 #-------------------------------------------
-def get_user_tasks_by_date(user_id, date):
-    """Получает задачи пользователя за конкретную дату"""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, user_id, task_text, is_completed, task_date 
-            FROM tasks 
-            WHERE user_id = ? AND strftime('%Y-%m-%d', task_date) = ?
-            ORDER BY task_date
-        ''', (user_id, date))
-        return cursor.fetchall()
-        
-def get_report_by_id_and_date(user_id, report_date):
-    """Получает отчет по ID пользователя и дате"""
+def get_user_summary(user_id):
+    """Сводка пользователя: (report_count, last_report_date, task_count, last_task_date) или None"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT id, report_text 
-            FROM reports 
-            WHERE user_id = ? AND strftime('%Y-%m-%d', report_date) = ?
-            LIMIT 1
-        ''', (user_id, report_date.split()[0]))
-        row = cursor.fetchone()
-        return {'id': row[0], 'text': row[1]} if row else None
-        
-def get_report_by_date(user_id, report_date):
-    """Получает отчет по ID пользователя и дате"""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, report_text, edited_at 
-            FROM reports 
-            WHERE user_id = ? AND strftime('%Y-%m-%d', report_date) = ?
-            LIMIT 1
-        ''', (user_id, report_date.split()[0]))
-        row = cursor.fetchone()
-        if row:
-            return {
-                'id': row[0],
-                'text': row[1],
-                'edited_at': row[2]
-            }
-        return None
-
-def get_last_user_task(user_id):
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT task_text, task_date, is_completed 
-            FROM tasks 
-            WHERE user_id = ? 
-            ORDER BY task_date DESC 
-            LIMIT 1
+            SELECT report_count, last_report_date, task_count, last_task_date
+            FROM user_summary
+            WHERE user_id = ?
         ''', (user_id,))
         return cursor.fetchone()
 
 
+# Таблицы, по которым ведется user_summary: (таблица, колонка даты, префикс колонок сводки)
+SUMMARY_SOURCES = (('reports', 'report_date', 'report'), ('tasks', 'task_date', 'task'))
+
+def _create_summary_triggers(cursor):
+    """Триггеры, поддерживающие user_summary при любых изменениях отчетов и задач.
+
+    Вставка только увеличивает счетчик и сдвигает «последнюю» запись; при
+    удалении последней записи она ищется заново по индексу (user_id, дата)."""
+    for table, date_column, prefix in SUMMARY_SOURCES:
+        last = f'''
+            (SELECT id, {date_column} FROM {table}
+             WHERE user_id = user_summary.user_id
+             ORDER BY {date_column} DESC, id DESC LIMIT 1)'''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_summary_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT OR IGNORE INTO user_summary (user_id) VALUES (NEW.user_id);
+                UPDATE user_summary SET
+                    {prefix}_count = {prefix}_count + 1,
+                    last_{prefix}_id = CASE WHEN last_{prefix}_date IS NULL OR NEW.{date_column} >= last_{prefix}_date
+                                            THEN NEW.id ELSE last_{prefix}_id END,
+                    last_{prefix}_date = CASE WHEN last_{prefix}_date IS NULL OR NEW.{date_column} >= last_{prefix}_date
+                                              THEN NEW.{date_column} ELSE last_{prefix}_date END
+                WHERE user_id = NEW.user_id;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_summary_delete AFTER DELETE ON {table}
+            BEGIN
+                UPDATE user_summary SET {prefix}_count = {prefix}_count - 1 WHERE user_id = OLD.user_id;
+                UPDATE user_summary SET (last_{prefix}_id, last_{prefix}_date) = {last}
+                WHERE user_id = OLD.user_id AND last_{prefix}_id = OLD.id;
+            END
+        ''')
+        # Смена автора или даты — редкий случай: пересчитываем обоих пользователей
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_summary_update AFTER UPDATE OF user_id, {date_column} ON {table}
+            BEGIN
+                INSERT OR IGNORE INTO user_summary (user_id) VALUES (NEW.user_id);
+                UPDATE user_summary SET
+                    {prefix}_count = (SELECT COUNT(*) FROM {table} WHERE user_id = user_summary.user_id),
+                    (last_{prefix}_id, last_{prefix}_date) = {last}
+                WHERE user_id IN (OLD.user_id, NEW.user_id);
+            END
+        ''')
+
+def _rebuild_user_summary(cursor):
+    """Заполняет user_summary по существующим отчетам и задачам"""
+    cursor.execute('DELETE FROM user_summary')
+    cursor.execute('''
+        INSERT INTO user_summary (user_id)
+        SELECT user_id FROM reports UNION SELECT user_id FROM tasks
+    ''')
+    for table, date_column, prefix in SUMMARY_SOURCES:
+        cursor.execute(f'''
+            UPDATE user_summary SET
+                {prefix}_count = (SELECT COUNT(*) FROM {table} WHERE user_id = user_summary.user_id),
+                (last_{prefix}_id, last_{prefix}_date) = (
+                    SELECT id, {date_column} FROM {table}
+                    WHERE user_id = user_summary.user_id
+                    ORDER BY {date_column} DESC, id DESC LIMIT 1)
+        ''')
+
+# Источники поиска: вид результата -> (таблица, колонка текста, колонка даты)
+SEARCH_SOURCES = {
+    'report': ('reports', 'report_text', 'report_date'),
+    'task': ('tasks', 'task_text', 'task_date'),
+    'history': ('report_history', 'report_text', 'edited_at'),
+}
+# Источники с индексом без копии текста (content=''): фрагмент строится в Python
+SEARCH_CONTENTLESS = {'history'}
+SEARCH_MARK = ('\x02', '\x03')  # Границы совпадения в snippet(); заменяются при выводе
+
+def _create_search_index(cursor, table, text_column):
+    """FTS5-индекс поверх table (external content) и триггеры синхронизации"""
+    fts = f'{table}_fts'
+    cursor.execute(f'''
+        CREATE VIRTUAL TABLE {fts} USING fts5(
+            {text_column}, content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO {fts} (rowid, {text_column}) VALUES (NEW.id, NEW.{text_column});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {text_column}) VALUES ('delete', OLD.id, OLD.{text_column});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_update AFTER UPDATE OF {text_column} ON {table}
+        BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {text_column}) VALUES ('delete', OLD.id, OLD.{text_column});
+            INSERT INTO {fts} (rowid, {text_column}) VALUES (NEW.id, NEW.{text_column});
+        END
+    ''')
+    # Индексируем строки, появившиеся до создания индекса
+    cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+def _create_history_search_index(cursor):
+    """FTS5-индекс истории правок без копии текста (content='').
+
+    В истории хранятся дельты, поэтому external content и триггеры здесь
+    не подходят: текст версии добавляет в индекс update_report, а удаляет
+    purge_rows_before, восстановив его из цепочки дельт."""
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS report_history_fts USING fts5(
+            report_text, content='', tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+
+def _search_terms(text):
+    """Слова строки поиска: [(слово, префикс ли)].
+
+    Слово ищется целиком; префиксом — только если пользователь поставил
+    после него '*' («бюдж*»). Префиксный запрос без префиксного индекса
+    перебирает все слова индекса с этим началом и на частых словах в
+    миллионах строк в сотни раз медленнее точного."""
+    return [(word.lower(), star == '*') for word, star in re.findall(r'(\w+)(\*?)', text)]
+
+def _fts_query(text):
+    """Строка поиска пользователя -> запрос FTS5: все слова, целиком или префиксом"""
+    return ' '.join(f'"{word}"*' if prefix else f'"{word}"' for word, prefix in _search_terms(text))
+
+def _snippet(text, query, tokens):
+    """Фрагмент text из tokens слов вокруг первого совпадения — как snippet() FTS5"""
+    terms = [re.escape(word) + (r'\w*' if prefix else r'\b') for word, prefix in _search_terms(query)]
+    pattern = re.compile(r'\b(?:' + '|'.join(terms) + ')', re.IGNORECASE)
+    spans = [match.span() for match in re.finditer(r'\w+', text)]
+    if not spans:
+        return text
+    first = next((index for index, (start, end) in enumerate(spans) if pattern.fullmatch(text, start, end)), 0)
+    start = max(0, min(first - tokens // 4, len(spans) - tokens))
+    end = min(len(spans), start + tokens)
+    fragment = pattern.sub(lambda match: SEARCH_MARK[0] + match.group(0) + SEARCH_MARK[1],
+                           text[spans[start][0]:spans[end - 1][1]])
+    return ('…' if start > 0 else '') + fragment + ('…' if end < len(spans) else '')
+
 #-------------------------------------------------------
+def _create_base_tables(cursor):
+    """Таблицы пользователей, отчетов, задач и истории правок (и колонки, добавленные позже)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            first_name TEXT,
+            username TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            report_text TEXT,
+            report_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            edited_by INTEGER DEFAULT NULL,
+            edited_at TIMESTAMP DEFAULT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(user_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            task_text TEXT,
+            task_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_completed BOOLEAN DEFAULT FALSE,
+            FOREIGN KEY(user_id) REFERENCES users(user_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS report_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            original_id INTEGER,
+            user_id INTEGER,
+            report_text TEXT,
+            report_date TIMESTAMP,
+            edited_by INTEGER,
+            edited_at TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(user_id)
+        )
+    ''')
+
+    # Базы, созданные до появления редактирования и статуса задач
+    report_columns = [column[1] for column in cursor.execute("PRAGMA table_info(reports)")]
+    if 'edited_by' not in report_columns:
+        cursor.execute('ALTER TABLE reports ADD COLUMN edited_by INTEGER DEFAULT NULL')
+    if 'edited_at' not in report_columns:
+        cursor.execute('ALTER TABLE reports ADD COLUMN edited_at TIMESTAMP DEFAULT NULL')
+    task_columns = [column[1] for column in cursor.execute("PRAGMA table_info(tasks)")]
+    if 'is_completed' not in task_columns:
+        cursor.execute('ALTER TABLE tasks ADD COLUMN is_completed BOOLEAN DEFAULT FALSE')
+
+def _create_user_date_indexes(cursor):
+    """Составные индексы для выборок по пользователю и дате"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_user_date ON reports (user_id, report_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_user_date ON tasks (user_id, task_date)')
+
+def _create_date_indexes(cursor):
+    """Индексы по дате для удаления устаревших строк (retention)"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_date ON reports (report_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_date ON tasks (task_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_report_history_edited ON report_history (edited_at)')
+
+def _create_conversation_state(cursor):
+    """Состояние незавершенных диалогов (Факт/План-отчеты, редактирование)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS conversation_state (
+            chat_id INTEGER PRIMARY KEY,
+            state TEXT NOT NULL,
+            payload TEXT,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversation_state_updated ON conversation_state (updated_at)')
+
+def _create_user_summary(cursor):
+    """Сводка по пользователю: число отчетов и задач, последние из них"""
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_summary'").fetchone()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_summary (
+            user_id INTEGER PRIMARY KEY,
+            report_count INTEGER NOT NULL DEFAULT 0,
+            last_report_id INTEGER,
+            last_report_date TIMESTAMP,
+            task_count INTEGER NOT NULL DEFAULT 0,
+            last_task_id INTEGER,
+            last_task_date TIMESTAMP
+        )
+    ''')
+    _create_summary_triggers(cursor)
+    if not exists:
+        _rebuild_user_summary(cursor)
+
+def _create_reminder_deliveries(cursor):
+    """Доставка напоминаний по дням и этапам"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reminder_deliveries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            day TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (day, stage, user_id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reminder_deliveries_sent ON reminder_deliveries (sent_at)')
+
+def _create_scheduler_runs(cursor):
+    """Последние запуски задач планировщика (для догоняющего запуска после рестарта)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduler_runs (
+            job TEXT PRIMARY KEY,
+            last_run TIMESTAMP NOT NULL
+        )
+    ''')
+
+def _create_search_indexes(cursor):
+    """Полнотекстовый поиск по отчетам, задачам и истории правок"""
+    for table, text_column in (('reports', 'report_text'), ('tasks', 'task_text'), ('report_history', 'report_text')):
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (f'{table}_fts',)).fetchone()
+        if not exists:
+            _create_search_index(cursor, table, text_column)
+
+def _migrate_history_deltas(cursor):
+    """История правок в виде дельт: номер версии, дельта и индекс без копии текста.
+
+    Строки, записанные раньше, хранят полный текст и остаются снимками."""
+    columns = [column[1] for column in cursor.execute("PRAGMA table_info(report_history)")]
+    if 'version' not in columns:
+        cursor.execute('ALTER TABLE report_history ADD COLUMN version INTEGER')
+    if 'delta' not in columns:
+        cursor.execute('ALTER TABLE report_history ADD COLUMN delta TEXT')
+    cursor.execute('''
+        UPDATE report_history SET version = (
+            SELECT COUNT(*) FROM report_history h
+            WHERE h.original_id = report_history.original_id AND h.id <= report_history.id)
+        WHERE version IS NULL
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_report_history_original ON report_history (original_id, version)')
+
+    for trigger in ('insert', 'delete', 'update'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS trg_report_history_fts_{trigger}')
+    cursor.execute('DROP TABLE IF EXISTS report_history_fts')
+    _create_history_search_index(cursor)
+    cursor.execute('''
+        INSERT INTO report_history_fts (rowid, report_text)
+        SELECT id, report_text FROM report_history WHERE report_text IS NOT NULL
+    ''')
+
+def _enable_incremental_vacuum(cursor):
+    """Инкрементальная очистка файла для retention; VACUUM требует выполнения вне транзакции"""
+    if cursor.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        cursor.execute('VACUUM')
+
+# Миграции схемы: (версия, описание, функция, выполнять ли в транзакции).
+# Версии только добавляются в конец; примененные записываются в schema_version.
+# Функции идемпотентны: базы, созданные до schema_version, проходят их все
+# один раз и дальше считаются актуальными.
+MIGRATIONS = [
+    (1, "Таблицы users, reports, tasks, report_history", _create_base_tables, True),
+    (2, "Индексы по пользователю и дате", _create_user_date_indexes, True),
+    (3, "Индексы по дате для retention", _create_date_indexes, True),
+    (4, "Таблица conversation_state", _create_conversation_state, True),
+    (5, "Таблица user_summary и триггеры", _create_user_summary, True),
+    (6, "Таблица reminder_deliveries", _create_reminder_deliveries, True),
+    (7, "Таблица scheduler_runs", _create_scheduler_runs, True),
+    (8, "Поисковые индексы FTS5", _create_search_indexes, True),
+    (9, "auto_vacuum=INCREMENTAL", _enable_incremental_vacuum, False),
+    (10, "История правок в виде дельт", _migrate_history_deltas, True),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn=None):
+    """Последняя примененная миграция (0 — таблицы schema_version еще нет)"""
+    conn = conn or get_db_connection()
+    try:
+        return conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return 0
+
 def migrate_db():
-    """Добавляет недостающие таблицы и колонки в базу данных"""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        try:
-            # Проверяем существующие таблицы
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = [table[0] for table in cursor.fetchall()]
-
-            # 1. Миграция таблицы reports
-            if 'reports' in tables:
-                cursor.execute("PRAGMA table_info(reports)")
-                report_columns = [column[1] for column in cursor.fetchall()]
-                
-                if 'edited_by' not in report_columns:
-                    cursor.execute('ALTER TABLE reports ADD COLUMN edited_by INTEGER DEFAULT NULL')
-                
-                if 'edited_at' not in report_columns:
-                    cursor.execute('ALTER TABLE reports ADD COLUMN edited_at TIMESTAMP DEFAULT NULL')
-
-            # 2. Создаем таблицу истории отчетов, если ее нет
-            if 'report_history' not in tables:
-                cursor.execute('''
-                    CREATE TABLE report_history (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        original_id INTEGER,
-                        user_id INTEGER,
-                        report_text TEXT,
-                        report_date TIMESTAMP,
-                        edited_by INTEGER,
-                        edited_at TIMESTAMP,
-                        FOREIGN KEY(user_id) REFERENCES users(user_id)
-                    )
-                ''')
-                print("Создана таблица report_history")
-
-            # 3. Проверяем таблицу tasks (на всякий случай)
-            if 'tasks' in tables:
-                cursor.execute("PRAGMA table_info(tasks)")
-                task_columns = [column[1] for column in cursor.fetchall()]
-                
-                if 'is_completed' not in task_columns:
-                    cursor.execute('ALTER TABLE tasks ADD COLUMN is_completed BOOLEAN DEFAULT FALSE')
+    """Применяет недостающие миграции и возвращает их число.
 
-            conn.commit()
-            print("Миграция базы данных успешно завершена")
-            
-        except Exception as e:
-            print(f"Ошибка миграции: {e}")
-            conn.rollback()
-            raise  # Можно убрать raise, если хотите продолжить работу при ошибке
+    Если схема актуальна, выполняется один запрос к schema_version — без
+    проверок sqlite_master и PRAGMA table_info. Каждая миграция применяется
+    в своей транзакции вместе с записью в schema_version; номер версии
+    перепроверяется под блокировкой записи, поэтому два процесса, стартовавших
+    одновременно, не применят миграцию дважды."""
+    if schema_version() >= SCHEMA_VERSION:
+        return 0
+
+    applied = 0
+    with get_write_connection() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        for version, name, migrate, in_transaction in MIGRATIONS:
+            cursor = conn.cursor()
+            if in_transaction:
+                cursor.execute('BEGIN IMMEDIATE')
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            try:
+                migrate(cursor)
+                cursor.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (version, name))
+                conn.commit()
+            except Exception as e:
+                print(f"Ошибка миграции {version} ({name}): {e}")
+                conn.rollback()
+                raise
+            print(f"Применена миграция {version}: {name}")
+            applied += 1
+
+    print(f"Схема базы данных обновлена до версии {SCHEMA_VERSION}")
+    return applied
 
 def add_user_if_not_exists(user_id, first_name=None, username=None):
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
             '''INSERT OR IGNORE INTO users (user_id, first_name, username) 
@@ -220,13 +544,36 @@ def add_user_if_not_exists(user_id, first_name=None, username=None):
             (user_id, first_name, username)
         )
         conn.commit()
+    _user_cache.invalidate(user_id)
 
 def get_user(user_id):
+    return _user_cache.get_or_load(user_id, lambda: _load_user(user_id))
+
+def _load_user(user_id):
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
         return cursor.fetchone()
 
+def get_report_owner(report_id):
+    """Возвращает user_id автора отчета (или None, если отчета нет)"""
+    report_id = int(report_id)
+    return _report_owner_cache.get_or_load(report_id, lambda: _load_report_owner(report_id))
+
+def _load_report_owner(report_id):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT user_id FROM reports WHERE id = ?', (report_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+def cache_stats():
+    """Счетчики кэшей: размер, попадания и промахи"""
+    return {
+        _user_cache.name: _user_cache.stats(),
+        _report_owner_cache.name: _report_owner_cache.stats(),
+    }
+
 def get_all_users():
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -245,7 +592,7 @@ def get_report_by_id(report_id):
         return cursor.fetchone()
 
 def add_report(user_id, report_text):
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
             '''INSERT INTO reports (user_id, report_text) 
@@ -253,7 +600,9 @@ def add_report(user_id, report_text):
             (user_id, report_text)
         )
         conn.commit()
-        return cursor.lastrowid
+        report_id = cursor.lastrowid
+    _report_owner_cache.set(report_id, user_id)
+    return report_id
 
 def get_user_reports(user_id):
     with get_db_connection() as conn:
@@ -266,6 +615,63 @@ def get_user_reports(user_id):
         ''', (user_id,))
         return cursor.fetchall()
 
+PAGE_SIZE = 10
+
+def _keyset_page(table, date_column, columns, user_id, before_id=None, after_id=None, limit=PAGE_SIZE):
+    """Страница строк пользователя по курсору (date_column, id), новые сверху.
+
+    before_id — id последней строки текущей страницы (листаем к более старым),
+    after_id — id первой строки текущей страницы (листаем к более новым).
+    Возвращает (rows, has_more): has_more — есть ли строки дальше в направлении листания."""
+    if after_id is not None:
+        cursor_clause = f'AND ({date_column}, id) > (SELECT {date_column}, id FROM {table} WHERE id = ?)'
+        order, params = 'ASC', (user_id, after_id, limit + 1)
+    elif before_id is not None:
+        cursor_clause = f'AND ({date_column}, id) < (SELECT {date_column}, id FROM {table} WHERE id = ?)'
+        order, params = 'DESC', (user_id, before_id, limit + 1)
+    else:
+        cursor_clause = ''
+        order, params = 'DESC', (user_id, limit + 1)
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {columns}
+            FROM {table}
+            WHERE user_id = ? {cursor_clause}
+            ORDER BY {date_column} {order}, id {order}
+            LIMIT ?
+        ''', params)
+        rows = cursor.fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after_id is not None:
+        rows.reverse()
+    return rows, has_more
+
+def get_user_reports_page(user_id, before_id=None, after_id=None, limit=PAGE_SIZE):
+    """Страница отчетов пользователя без текста: [(id, report_date, edited_at)]"""
+    return _keyset_page('reports', 'report_date', 'id, report_date, edited_at',
+                        user_id, before_id, after_id, limit)
+
+def get_user_tasks_page(user_id, before_id=None, after_id=None, limit=PAGE_SIZE):
+    """Страница задач пользователя без текста: [(id, task_date, is_completed)]"""
+    return _keyset_page('tasks', 'task_date', 'id, task_date, is_completed',
+                        user_id, before_id, after_id, limit)
+
+def user_has_reports(user_id):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM reports WHERE user_id = ?)', (user_id,))
+        return bool(cursor.fetchone()[0])
+
+def user_has_tasks(user_id):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM tasks WHERE user_id = ?)', (user_id,))
+        return bool(cursor.fetchone()[0])
+
 def get_users_with_reports():
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -277,35 +683,318 @@ def get_users_with_reports():
         ''')
         return cursor.fetchall()
         
-def update_report(report_id, new_text, editor_id):
-    """Обновляет текст отчета и автоматически сохраняет старую версию"""
+COMPLIANCE_TZ = os.getenv("COMPLIANCE_TZ", "Europe/Moscow")  # Пояс рабочего дня для сводки сдачи отчетов
+COMPLIANCE_PAGE_SIZE = int(os.getenv("COMPLIANCE_PAGE_SIZE", "20"))
+
+def business_day(now=None, tz=COMPLIANCE_TZ):
+    """Текущий рабочий день 'YYYY-MM-DD' в поясе tz; в выходные — пятница"""
+    day = (now or datetime.now(pytz.timezone(tz))).date()
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day.strftime('%Y-%m-%d')
+
+def _utc_day_range(day, tz=COMPLIANCE_TZ):
+    """Границы суток day ('YYYY-MM-DD') в поясе tz как строки UTC.
+
+    CURRENT_TIMESTAMP пишет даты в UTC, поэтому сутки по Москве — это
+    диапазон с 21:00 предыдущего дня до 21:00 по UTC."""
+    zone = pytz.timezone(tz)
+    start = datetime.strptime(day, '%Y-%m-%d')
+    bounds = (zone.localize(start), zone.localize(start + timedelta(days=1)))
+    return tuple(bound.astimezone(pytz.utc).strftime('%Y-%m-%d %H:%M:%S') for bound in bounds)
+
+def previous_business_day(day):
+    """Рабочий день перед day ('YYYY-MM-DD'): для понедельника — пятница"""
+    previous = datetime.strptime(day, '%Y-%m-%d').date() - timedelta(days=1)
+    while previous.weekday() >= 5:
+        previous -= timedelta(days=1)
+    return previous.strftime('%Y-%m-%d')
+
+def get_report_detail(report_id, tz=COMPLIANCE_TZ):
+    """Отчет для просмотра админом одним запросом: текст, автор, планы за
+    предыдущий рабочий день и последний План-отчет.
+
+    Границы предыдущего рабочего дня зависят от даты отчета, поэтому запрос
+    берет планы автора за четыре дня до отчета (среди них всегда весь
+    предыдущий рабочий день, даже для понедельника), а точный день
+    отбирается уже здесь. Возвращает словарь или None, если отчета нет."""
     with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            WITH report AS (
+                SELECT r.id, r.user_id, r.report_text, r.report_date, r.edited_at,
+                       u.first_name, u.username
+                FROM reports r
+                LEFT JOIN users u ON u.user_id = r.user_id
+                WHERE r.id = ?
+            ),
+            recent_tasks AS (
+                SELECT t.task_text, t.is_completed, t.task_date
+                FROM report
+                JOIN tasks t ON t.user_id = report.user_id
+                WHERE t.task_date >= datetime(report.report_date, '-4 days')
+                  AND t.task_date < report.report_date
+                ORDER BY t.task_date
+            )
+            SELECT report.*,
+                   (SELECT json_group_array(json_array(task_text, is_completed, task_date))
+                    FROM recent_tasks) AS recent,
+                   lt.task_text, lt.task_date, lt.is_completed
+            FROM report
+            LEFT JOIN user_summary s ON s.user_id = report.user_id
+            LEFT JOIN tasks lt ON lt.id = s.last_task_id
+        ''', (report_id,))
+        row = cursor.fetchone()
+    if row is None:
+        return None
+
+    (report_id, user_id, text, report_date, edited_at, first_name, username,
+     recent, last_text, last_date, last_completed) = row
+    zone = pytz.timezone(tz)
+    day = datetime.fromisoformat(report_date).replace(tzinfo=pytz.utc).astimezone(zone).strftime('%Y-%m-%d')
+    previous_day = previous_business_day(day)
+    day_start, day_end = _utc_day_range(previous_day, tz)
+    return {
+        'id': report_id,
+        'user_id': user_id,
+        'text': text,
+        'date': report_date,
+        'day': day,
+        'edited_at': edited_at,
+        'first_name': first_name,
+        'username': username,
+        'previous_day': previous_day,
+        # (task_text, is_completed, task_date)
+        'previous_tasks': [tuple(task) for task in json.loads(recent) if day_start <= task[2] < day_end],
+        # (task_text, task_date, is_completed)
+        'last_task': (last_text, last_date, last_completed) if last_text is not None else None,
+    }
+
+def get_daily_compliance(day=None, tz=COMPLIANCE_TZ, exclude_ids=(), limit=COMPLIANCE_PAGE_SIZE, offset=0):
+    """Кто сдал Факт- и План-отчеты за рабочий день — одним запросом.
+
+    Статус берется из user_summary: если последний отчет раньше начала дня —
+    отчета нет, если попадает в день — есть. Поиск по индексу (user_id, дата)
+    нужен только тем, у кого есть отчеты новее этого дня. Статусы
+    материализуются один раз, и из них в том же запросе считаются итоги и
+    выбирается страница.
+
+    Возвращает (rows, totals): rows — страница (user_id, first_name, username,
+    has_fact, has_plan), сначала не сдавшие; totals — {'day', 'users', 'fact', 'plan'}."""
+    day = day or business_day(tz=tz)
+    day_start, day_end = _utc_day_range(day, tz)
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            WITH status AS MATERIALIZED (
+                SELECT u.user_id, u.first_name, u.username,
+                       CASE WHEN s.last_report_date IS NULL OR s.last_report_date < ?1 THEN 0
+                            WHEN s.last_report_date < ?2 THEN 1
+                            ELSE EXISTS (SELECT 1 FROM reports r WHERE r.user_id = u.user_id
+                                         AND r.report_date >= ?1 AND r.report_date < ?2)
+                       END AS has_fact,
+                       CASE WHEN s.last_task_date IS NULL OR s.last_task_date < ?1 THEN 0
+                            WHEN s.last_task_date < ?2 THEN 1
+                            ELSE EXISTS (SELECT 1 FROM tasks t WHERE t.user_id = u.user_id
+                                         AND t.task_date >= ?1 AND t.task_date < ?2)
+                       END AS has_plan
+                FROM users u
+                LEFT JOIN user_summary s ON s.user_id = u.user_id
+                WHERE u.user_id NOT IN (SELECT value FROM json_each(?3))
+            ), totals AS (
+                SELECT COUNT(*), SUM(has_fact), SUM(has_plan) FROM status
+            )
+            SELECT status.*, totals.* FROM status, totals
+            ORDER BY has_fact, has_plan, first_name COLLATE NOCASE, user_id
+            LIMIT ?4 OFFSET ?5
+        ''', (day_start, day_end, json.dumps(list(exclude_ids)), limit, offset))
+        rows = cursor.fetchall()
+    totals = {'day': day, 'users': 0, 'fact': 0, 'plan': 0}
+    if rows:
+        totals.update(users=rows[0][5], fact=rows[0][6], plan=rows[0][7])
+    return [
+        (user_id, first_name, username, bool(has_fact), bool(has_plan))
+        for user_id, first_name, username, has_fact, has_plan, *_ in rows
+    ], totals
+
+def get_pending_users(day=None, exclude_ids=(), stage=None, tz=COMPLIANCE_TZ):
+    """Пользователи, не сдавшие Факт- или План-отчет за рабочий день.
+
+    Сдавшие оба отчета отсекаются анти-соединением (NOT EXISTS по индексам
+    (user_id, дата)) в одном запросе. Исключаются exclude_ids (админы) и, если
+    задан stage, те, кому напоминание этого этапа за день уже доставлено.
+    Возвращает [(user_id, first_name, has_fact, has_plan)]."""
+    day = day or business_day(tz=tz)
+    day_start, day_end = _utc_day_range(day, tz)
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT u.user_id, u.first_name,
+                   EXISTS (SELECT 1 FROM reports r WHERE r.user_id = u.user_id
+                           AND r.report_date >= ?1 AND r.report_date < ?2) AS has_fact,
+                   EXISTS (SELECT 1 FROM tasks t WHERE t.user_id = u.user_id
+                           AND t.task_date >= ?1 AND t.task_date < ?2) AS has_plan
+            FROM users u
+            WHERE u.user_id NOT IN (SELECT value FROM json_each(?3))
+              AND NOT (has_fact AND has_plan)
+              AND NOT EXISTS (SELECT 1 FROM reminder_deliveries d
+                              WHERE d.day = ?4 AND d.stage = ?5 AND d.user_id = u.user_id
+                              AND d.status = 'sent')
+        ''', (day_start, day_end, json.dumps(list(exclude_ids)), day, stage))
+        return [
+            (user_id, first_name, bool(has_fact), bool(has_plan))
+            for user_id, first_name, has_fact, has_plan in cursor.fetchall()
+        ]
+
+def get_scheduler_runs():
+    """Время последнего запуска задач планировщика: {job: 'YYYY-MM-DD HH:MM:SS' UTC}"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT job, last_run FROM scheduler_runs')
+        return dict(cursor.fetchall())
+
+def set_scheduler_run(job, last_run):
+    with get_write_connection() as conn:
+        conn.execute('''
+            INSERT INTO scheduler_runs (job, last_run) VALUES (?, ?)
+            ON CONFLICT (job) DO UPDATE SET last_run = excluded.last_run
+        ''', (job, last_run))
+
+def record_reminder_deliveries(day, stage, results):
+    """Сохраняет итоги рассылки напоминаний: results — [(user_id, ошибка или None)]"""
+    with get_write_connection() as conn:
+        conn.executemany('''
+            INSERT INTO reminder_deliveries (day, stage, user_id, status, error)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (day, stage, user_id) DO UPDATE SET
+                status = excluded.status, error = excluded.error, sent_at = CURRENT_TIMESTAMP
+        ''', [
+            (day, stage, user_id, 'sent' if error is None else 'failed', None if error is None else str(error))
+            for user_id, error in results
+        ])
+
+# История правок: строка версии v хранит либо полный текст (снимок), либо
+# обратную дельту — как получить версию v из следующей за ней (v + 1 или
+# текущий текст отчета). Каждая HISTORY_SNAPSHOT_EVERY-я версия — снимок,
+# поэтому восстановление проходит не больше стольких дельт.
+HISTORY_SNAPSHOT_EVERY = int(os.getenv("HISTORY_SNAPSHOT_EVERY", "10"))
+
+def _make_delta(newer, older):
+    """Построчная дельта, восстанавливающая older из newer (JSON).
+
+    Элемент [начало, конец] — взять строки newer[начало:конец], строка — вставить
+    текст как есть. Комментарий админа в начале или конце длинного отчета
+    занимает в дельте только сам комментарий."""
+    newer_lines = newer.splitlines(keepends=True)
+    older_lines = older.splitlines(keepends=True)
+    ops = []
+    matcher = SequenceMatcher(None, newer_lines, older_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(older_lines[j1:j2]))
+    return json.dumps(ops, ensure_ascii=False, separators=(',', ':'))
+
+def _apply_delta(delta, newer):
+    """Восстанавливает предыдущую версию из newer по дельте _make_delta"""
+    newer_lines = newer.splitlines(keepends=True)
+    return ''.join(
+        ''.join(newer_lines[op[0]:op[1]]) if isinstance(op, list) else op
+        for op in json.loads(delta)
+    )
+
+def _history_texts(cursor, report_id, from_version, to_version):
+    """Тексты версий from_version..to_version отчета: {версия: текст}.
+
+    Идет от ближайшего снимка не младше to_version (или от текущего текста
+    отчета) к старым версиям, применяя дельты. Если цепочку не от чего
+    начать, текст версии — None."""
+    snapshot = cursor.execute('''
+        SELECT MIN(version) FROM report_history
+        WHERE original_id = ? AND version >= ? AND report_text IS NOT NULL
+    ''', (report_id, to_version)).fetchone()[0]
+    text = None
+    if snapshot is None:
+        row = cursor.execute('SELECT report_text FROM reports WHERE id = ?', (report_id,)).fetchone()
+        text = row[0] if row else None
+    cursor.execute('''
+        SELECT version, report_text, delta FROM report_history
+        WHERE original_id = ? AND version BETWEEN ? AND ?
+        ORDER BY version DESC
+    ''', (report_id, from_version, snapshot if snapshot is not None else 2 ** 62))
+    texts = {}
+    for version, snapshot_text, delta in cursor.fetchall():
+        if snapshot_text is not None:
+            text = snapshot_text
+        elif text is not None and delta is not None:
+            text = _apply_delta(delta, text)
+        else:
+            text = None
+        texts[version] = text
+    return texts
+
+def _detach_history(cursor, report_id, current_text):
+    """Перед удалением отчета делает снимком его последнюю версию в истории:
+    ее дельта ссылается на текст отчета, которого больше не будет"""
+    row = cursor.execute('''
+        SELECT id, delta FROM report_history
+        WHERE original_id = ? ORDER BY version DESC LIMIT 1
+    ''', (report_id,)).fetchone()
+    if row and row[1] is not None and current_text is not None:
+        cursor.execute(
+            'UPDATE report_history SET report_text = ?, delta = NULL WHERE id = ?',
+            (_apply_delta(row[1], current_text), row[0])
+        )
+
+def update_report(report_id, new_text, editor_id):
+    """Обновляет текст отчета и сохраняет старую версию в истории (дельтой или снимком)"""
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         try:
             # Получаем текущую дату/время
             current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             
-            # Сначала получаем старый отчет
-            cursor.execute('SELECT * FROM reports WHERE id = ?', (report_id,))
+            # Сначала получаем старый отчет и номер следующей версии
+            cursor.execute('''
+                SELECT r.user_id, r.report_text, r.report_date,
+                       (SELECT COALESCE(MAX(h.version), 0) + 1 FROM report_history h WHERE h.original_id = r.id)
+                FROM reports r
+                WHERE r.id = ?
+            ''', (report_id,))
             old_report = cursor.fetchone()
             
             if not old_report:
                 print(f"Отчет с ID {report_id} не найден")
                 return False
+            user_id, old_text, report_date, version = old_report
+            old_text = old_text or ""
 
-            # Создаем архивную копию старого отчета
+            # Старая версия — дельтой от нового текста; снимком каждую N-ю версию
+            # или если дельта не короче самого текста
+            delta = None
+            if HISTORY_SNAPSHOT_EVERY <= 0 or version % HISTORY_SNAPSHOT_EVERY:
+                delta = _make_delta(new_text, old_text)
+                if len(delta) >= len(old_text):
+                    delta = None
             cursor.execute('''
                 INSERT INTO report_history 
-                (original_id, user_id, report_text, report_date, edited_by, edited_at)
-                VALUES (?, ?, ?, ?, ?, ?)
+                (original_id, user_id, report_text, report_date, edited_by, edited_at, version, delta)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 report_id,
-                old_report[1],  # user_id
-                old_report[2],  # report_text
-                old_report[3],  # report_date
+                user_id,
+                old_text if delta is None else None,
+                report_date,
                 editor_id,
-                current_time
+                current_time,
+                version,
+                delta
             ))
+            cursor.execute(
+                'INSERT INTO report_history_fts (rowid, report_text) VALUES (?, ?)',
+                (cursor.lastrowid, old_text)
+            )
             
             # Обновляем текущий отчет
             cursor.execute('''
@@ -315,7 +1004,8 @@ def update_report(report_id, new_text, editor_id):
             ''', (new_text, editor_id, current_time, report_id))
             
             conn.commit()
-            print(f"Отчет {report_id} успешно обновлен, старая версия сохранена")
+            _report_owner_cache.invalidate(int(report_id))
+            print(f"Отчет {report_id} успешно обновлен, старая версия {version} сохранена")
             return True
             
         except sqlite3.Error as e:
@@ -326,45 +1016,193 @@ def update_report(report_id, new_text, editor_id):
             print(f"Неожиданная ошибка при обновлении отчета {report_id}: {e}")
             conn.rollback()
             return False
-def get_report_history(report_id):
-    """Получает историю изменений отчета"""
+
+def get_report_history(report_id, with_text=False):
+    """История изменений отчета, новые версии первыми.
+
+    По умолчанию — только метаданные (id, version, edited_by, edited_at),
+    без восстановления текстов. С with_text=True к каждой строке
+    добавляется текст версии."""
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT id, report_text, edited_at 
+            SELECT id, version, edited_by, edited_at 
             FROM report_history 
             WHERE original_id = ?
-            ORDER BY edited_at DESC
+            ORDER BY version DESC
         ''', (report_id,))
-        return cursor.fetchall()
+        rows = cursor.fetchall()
+        if not with_text or not rows:
+            return rows
+        texts = _history_texts(cursor, report_id, rows[-1][1], rows[0][1])
+        return [row + (texts.get(row[1]),) for row in rows]
 
-def can_edit_report(user_id, report_id):
-    """Проверяет, может ли пользователь редактировать отчет"""
+def get_report_version(report_id, version):
+    """Текст версии version отчета (1 — исходный текст) или None, если ее нет.
+
+    Версия после последней сохраненной — это текущий текст отчета."""
     with get_db_connection() as conn:
         cursor = conn.cursor()
+        texts = _history_texts(cursor, report_id, version, version)
+        if version in texts:
+            return texts[version]
+        row = cursor.execute('''
+            SELECT r.report_text, (SELECT MAX(h.version) FROM report_history h WHERE h.original_id = r.id)
+            FROM reports r WHERE r.id = ?
+        ''', (report_id,)).fetchone()
+        if row and version == (row[1] or 0) + 1:
+            return row[0]
+        return None
+
+def can_edit_report(user_id, report_id):
+    """Проверяет, может ли пользователь редактировать отчет"""
+    # Админ может редактировать любой отчет
+    if config.is_admin(user_id):
+        return True
         
-        # Проверяем, является ли пользователь админом (используем импортированный bot)
-        if user_id in bot.ADMIN_IDS:
-            return True
-            
-        # Если не админ, проверяем, является ли пользователь автором отчета
-        cursor.execute('SELECT user_id FROM reports WHERE id = ?', (report_id,))
-        report = cursor.fetchone()
-        if not report:
-            return False
-        return user_id == report[0]
+    # Если не админ, проверяем, является ли пользователь автором отчета
+    owner_id = get_report_owner(report_id)
+    if owner_id is None:
+        return False
+    return user_id == owner_id
 
 def delete_report(report_id):
     """Удаляет отчет по ID"""
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         try:
+            row = cursor.execute('SELECT report_text FROM reports WHERE id = ?', (report_id,)).fetchone()
+            if row:
+                _detach_history(cursor, report_id, row[0])
             cursor.execute('DELETE FROM reports WHERE id = ?', (report_id,))
             conn.commit()
             return cursor.rowcount > 0
         except Exception as e:
             print(f"Ошибка удаления отчета: {e}")
+            # Иначе get_write_connection закоммитит снимок истории без удаления отчета
+            conn.rollback()
             return False
+        finally:
+            _report_owner_cache.invalidate(int(report_id))
+
+def purge_rows_before(table, date_column, cutoff, batch_size=500, archive_conn=None):
+    """Удаляет из table одну пачку строк со значением date_column < cutoff.
+
+    Каждая пачка — отдельная короткая транзакция, чтобы не держать блокировку
+    записи. Если передан archive_conn, строки сначала копируются в одноименную
+    таблицу архивной базы. Возвращает число удаленных строк (0 — удалять нечего)."""
+    with get_write_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f'SELECT * FROM {table} WHERE {date_column} < ? ORDER BY {date_column} LIMIT ?',
+            (cutoff, batch_size)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+        columns = [column[0] for column in cursor.description]
+
+        if table == 'reports':
+            text_index = columns.index('report_text')
+            for row in rows:
+                _detach_history(cursor, row[0], row[text_index])
+        elif table == 'report_history':
+            rows = _purge_history_index(cursor, rows, columns)
+
+        if archive_conn is not None:
+            archive_conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ({", ".join(columns)})')
+            archive_conn.executemany(
+                f'INSERT INTO {table} VALUES ({", ".join("?" * len(columns))})', rows
+            )
+            archive_conn.commit()
+
+        ids = [row[0] for row in rows]
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ({", ".join("?" * len(ids))})', ids
+        )
+
+    if table == 'reports':
+        for report_id in ids:
+            _report_owner_cache.invalidate(report_id)
+    return len(ids)
+
+def _purge_history_index(cursor, rows, columns):
+    """Убирает удаляемые версии истории из report_history_fts.
+
+    Индекс без копии текста удаляет запись только по исходному тексту,
+    поэтому тексты версий восстанавливаются из цепочки дельт. Возвращает
+    строки с полным текстом вместо дельты — в таком виде они уходят в архив."""
+    id_index = columns.index('id')
+    report_index = columns.index('original_id')
+    version_index = columns.index('version')
+    text_index = columns.index('report_text')
+    delta_index = columns.index('delta')
+    versions = {}
+    for row in rows:
+        bounds = versions.setdefault(row[report_index], [row[version_index], row[version_index]])
+        bounds[0] = min(bounds[0], row[version_index])
+        bounds[1] = max(bounds[1], row[version_index])
+    texts = {
+        report_id: _history_texts(cursor, report_id, low, high)
+        for report_id, (low, high) in versions.items()
+    }
+
+    restored = []
+    for row in rows:
+        text = texts[row[report_index]].get(row[version_index])
+        if text is not None:
+            cursor.execute(
+                "INSERT INTO report_history_fts (report_history_fts, rowid, report_text) VALUES ('delete', ?, ?)",
+                (row[id_index], text)
+            )
+        else:
+            print(f"Версия {row[version_index]} отчета {row[report_index]} не восстанавливается, запись индекса оставлена")
+        row = list(row)
+        if text is not None:
+            row[text_index], row[delta_index] = text, None
+        restored.append(tuple(row))
+    return restored
+
+def incremental_vacuum(pages):
+    """Возвращает в систему до pages свободных страниц файла.
+
+    Возвращает (освобождено страниц, осталось свободных)."""
+    with get_write_connection() as conn:
+        before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        # executescript проходит прагму до конца; execute освободил бы одну страницу
+        conn.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+        after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return before - after, after
+
+def get_conversation_state(chat_id, updated_after):
+    """Возвращает (state, payload) незавершенного диалога, обновленного после updated_after"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT state, payload FROM conversation_state
+            WHERE chat_id = ? AND updated_at > ?
+        ''', (chat_id, updated_after))
+        return cursor.fetchone()
+
+def set_conversation_state(chat_id, state, payload, updated_at):
+    with get_write_connection() as conn:
+        conn.execute('''
+            INSERT INTO conversation_state (chat_id, state, payload, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET
+                state = excluded.state, payload = excluded.payload, updated_at = excluded.updated_at
+        ''', (chat_id, state, payload, updated_at))
+
+def clear_conversation_state(chat_id):
+    with get_write_connection() as conn:
+        conn.execute('DELETE FROM conversation_state WHERE chat_id = ?', (chat_id,))
+
+def purge_conversation_states(updated_before):
+    """Удаляет брошенные диалоги; возвращает число удаленных"""
+    with get_write_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM conversation_state WHERE updated_at <= ?', (updated_before,))
+        return cursor.rowcount
 
 def get_task_by_id(task_id):
     with get_db_connection() as conn:
@@ -376,7 +1214,7 @@ def get_task_by_id(task_id):
         return cursor.fetchone()
 
 def toggle_task_status(task_id):
-    with get_db_connection() as conn:
+    with get_write_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             UPDATE tasks SET is_completed = NOT is_completed 
@@ -390,12 +1228,169 @@ def has_recent_report(user_id, hours=12):
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT COUNT(*) FROM reports 
-            WHERE user_id = ? 
-            AND datetime(report_date) >= datetime('now', ?)
+            SELECT EXISTS (
+                SELECT 1 FROM reports 
+                WHERE user_id = ? 
+                AND report_date >= datetime('now', ?)
+            )
         ''', (user_id, f'-{hours} hours'))
         return cursor.fetchone()[0] > 0
 
-# Инициализация базы данных
-init_db()
-migrate_db()
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "5"))
+SEARCH_WINDOW = int(os.getenv("SEARCH_WINDOW", "1000"))  # Сколько последних совпадений источника ранжировать
+BM25_K1 = 1.2  # Параметры bm25 — как у встроенной функции FTS5
+BM25_B = 0.75
+
+def _window_query(fts):
+    """Условие «среди SEARCH_WINDOW последних совпадений» для {fts} MATCH ?"""
+    return f'''{fts}.rowid >= (
+        SELECT MIN(rowid) FROM (
+            SELECT rowid FROM {fts} WHERE {fts} MATCH ? ORDER BY rowid DESC LIMIT ?))'''
+
+def _estimate_idf(cursor, fts, table, terms):
+    """idf слов запроса для bm25 по окну последних совпадений каждого слова.
+
+    Встроенная bm25() считает документы со словом, проходя весь его список
+    в индексе: для слова из половины миллиона отчетов это десятки мс на
+    запрос. Последние SEARCH_WINDOW совпадений слова находятся по индексу
+    за доли мс; доля строк (по диапазону id), которую они покрывают, дает
+    оценку доли документов со словом. Если совпадений меньше окна, число точное."""
+    # MIN и MAX отдельными подзапросами: вместе в одном SELECT SQLite сканирует всю таблицу
+    first_id, last_id = cursor.execute(f'SELECT (SELECT MIN(id) FROM {table}), (SELECT MAX(id) FROM {table})').fetchone()
+    total = last_id - first_id + 1 if last_id is not None else 0
+    idf = {}
+    for word, prefix in terms:
+        hits, window_start = cursor.execute(
+            f'SELECT COUNT(*), MIN(rowid) FROM (SELECT rowid FROM {fts} WHERE {fts} MATCH ? ORDER BY rowid DESC LIMIT ?)',
+            (f'"{word}"*' if prefix else f'"{word}"', SEARCH_WINDOW)
+        ).fetchone()
+        if hits >= SEARCH_WINDOW:
+            hits = hits * total / (last_id - window_start + 1)
+        # Как в FTS5: отрицательный idf у слова из большинства строк заменяется почти нулем
+        idf[word, prefix] = max(math.log((total - hits + 0.5) / (hits + 0.5)), 1e-6)
+    return idf
+
+def _bm25_ranks(texts, terms, idf):
+    """rank (чем меньше, тем лучше — как {fts}.rank) для каждого текста.
+
+    Длина текста считается по пробелам, частота слова — регулярным
+    выражением: это в разы быстрее полного разбора тысячи текстов на слова."""
+    patterns = [(idf[word, prefix], re.compile(r'(?<!\w)' + re.escape(word) + (r'\w*' if prefix else r'(?!\w)')))
+                for word, prefix in terms]
+    texts = [text.lower() for text in texts]
+    lengths = [len(text.split()) for text in texts]
+    average = sum(lengths) / len(lengths) if lengths and sum(lengths) else 1
+    ranks = []
+    for text, length in zip(texts, lengths):
+        score = 0.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average)
+        for weight, pattern in patterns:
+            # Строка совпала в индексе, даже если Python разбил слово иначе, чем токенизатор
+            frequency = max(len(pattern.findall(text)), 1)
+            score += weight * frequency * (BM25_K1 + 1) / (frequency + norm)
+        ranks.append(-score)
+    return ranks
+
+def search(text, limit=SEARCH_PAGE_SIZE, offset=0, snippet_tokens=12):
+    """Полнотекстовый поиск по отчетам, задачам и истории правок.
+
+    В каждом источнике по bm25 ранжируются только SEARCH_WINDOW последних
+    совпадений: ограничение по rowid FTS5 применяет внутри индекса, поэтому
+    частое слово в миллионах отчетов не заставляет считать рейтинг для всех.
+    Для отчетов и задач bm25 считается в Python по тексту строк окна с
+    оценкой idf (_estimate_idf); индекс истории правок не хранит текст, ее
+    рейтинг дает FTS5 (история на порядки меньше отчетов). Формула одна,
+    поэтому источники сливаются в общий рейтинг. Фрагменты строятся в Python,
+    для истории — из восстановленных версий. Возвращает (rows, has_more):
+    rows — [(вид, id, user_id, дата, фрагмент)], где совпадения во фрагменте
+    обрамлены SEARCH_MARK."""
+    terms = _search_terms(text)
+    query = _fts_query(text)
+    if not query:
+        return [], False
+
+    per_source = offset + limit + 1
+    candidates = []  # (rank, вид, id, user_id, дата, текст или (отчет, версия))
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        for kind, (table, text_column, date_column) in SEARCH_SOURCES.items():
+            fts = f'{table}_fts'
+            if kind in SEARCH_CONTENTLESS:
+                # Текста в индексе нет: вместо него — отчет и версия для восстановления
+                cursor.execute(f'''
+                    SELECT {fts}.rank, t.id, t.user_id, t.{date_column}, t.original_id, t.version
+                    FROM {fts}
+                    JOIN {table} t ON t.id = {fts}.rowid
+                    WHERE {fts} MATCH ? AND {_window_query(fts)}
+                    ORDER BY {fts}.rank
+                    LIMIT ?
+                ''', (query, query, SEARCH_WINDOW, per_source))
+                candidates += [(rank, kind, row_id, user_id, date, (report_id, version))
+                               for rank, row_id, user_id, date, report_id, version in cursor.fetchall()]
+                continue
+
+            cursor.execute(f'''
+                SELECT t.id, t.user_id, t.{date_column}, t.{text_column}
+                FROM {fts}
+                JOIN {table} t ON t.id = {fts}.rowid
+                WHERE {fts} MATCH ? AND {_window_query(fts)}
+            ''', (query, query, SEARCH_WINDOW))
+            rows = cursor.fetchall()
+            if not rows:
+                continue
+            ranks = _bm25_ranks([row[3] or "" for row in rows], terms, _estimate_idf(cursor, fts, table, terms))
+            ranked = sorted(zip(ranks, rows), key=lambda item: item[0])[:per_source]
+            candidates += [(rank, kind, row_id, user_id, date, row_text)
+                           for rank, (row_id, user_id, date, row_text) in ranked]
+
+        candidates.sort(key=lambda candidate: candidate[0])
+        page = candidates[offset:offset + limit + 1]
+        results = []
+        for rank, kind, row_id, user_id, date, source in page[:limit]:
+            if kind in SEARCH_CONTENTLESS:
+                report_id, version = source
+                source = _history_texts(cursor, report_id, version, version).get(version)
+            fragment = _snippet(source, text, snippet_tokens) if source is not None else ""
+            results.append((kind, row_id, user_id, date, fragment))
+    return results, len(page) > limit
+
+EXPORT_SOURCES = (
+    ('report', '''
+        SELECT r.id, r.user_id, u.first_name, u.username, r.report_date, r.report_text, NULL
+        FROM reports r
+        LEFT JOIN users u ON u.user_id = r.user_id
+        WHERE r.report_date >= ? AND r.report_date < ?
+        ORDER BY r.report_date
+    '''),
+    ('task', '''
+        SELECT t.id, t.user_id, u.first_name, u.username, t.task_date, t.task_text, t.is_completed
+        FROM tasks t
+        LEFT JOIN users u ON u.user_id = t.user_id
+        WHERE t.task_date >= ? AND t.task_date < ?
+        ORDER BY t.task_date
+    '''),
+)
+
+def iter_export_rows(first_day, last_day, tz=COMPLIANCE_TZ, batch_size=1000):
+    """Отчеты и планы за дни first_day..last_day ('YYYY-MM-DD', включительно) в поясе tz.
+
+    Генератор: строки читаются с курсора пачками по batch_size, в памяти
+    держится только текущая пачка. Сначала идут все Факт-отчеты, затем
+    План-отчеты — каждый источник обходится по индексу даты, без общей
+    сортировки во временной таблице. Выдает (вид, id, user_id, имя, username,
+    дата UTC, текст, is_completed). Соединение берется свое для потока,
+    поэтому генератор нужно дочитывать в том же потоке, где он создан."""
+    day_start = _utc_day_range(first_day, tz)[0]
+    day_end = _utc_day_range(last_day, tz)[1]
+    conn = get_db_connection()
+    for kind, query in EXPORT_SOURCES:
+        cursor = conn.execute(query, (day_start, day_end))
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield (kind,) + row
+        finally:
+            cursor.close()
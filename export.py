@@ -0,0 +1,182 @@
+"""Выгрузка отчетов и планов за период в файл для админа (команда /export).
+
+Строки читаются с курсора базы пачками (database.iter_export_rows) и сразу
+пишутся в сжатый файл: CSV внутри gzip или XLSX, если установлен openpyxl
+(режим write_only тоже не держит лист в памяти). Файл собирается в пуле
+потоков, а не в обработчике сообщения, затем отправляется документом и
+удаляется. Одновременно в одном чате готовится не больше одной выгрузки.
+"""
+import csv
+import gzip
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytz
+import database
+import metrics
+
+try:
+    import openpyxl
+except ImportError:  # XLSX необязателен: без openpyxl доступен только CSV
+    openpyxl = None
+
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))  # Строк за одно чтение с курсора
+EXPORT_DEFAULT_DAYS = int(os.getenv("EXPORT_DEFAULT_DAYS", "7"))  # Период без явных дат
+EXPORT_MAX_DAYS = int(os.getenv("EXPORT_MAX_DAYS", "92"))
+EXPORT_DIR = os.getenv("EXPORT_DIR") or None  # Каталог временных файлов; по умолчанию системный
+EXPORT_TZ = os.getenv("EXPORT_TZ", "Europe/Moscow")  # Пояс дат периода и времени в файле
+
+FORMATS = ('csv', 'xlsx')
+COLUMNS = ["Вид", "ID", "ID пользователя", "Имя", "Username", "Дата (МСК)", "Текст", "Выполнено"]
+KIND_TITLES = {'report': "Факт", 'task': "План"}
+
+# С этих символов Excel начинает формулу; такой текст сохраняем с апострофом
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+_active_chats = set()
+_active_lock = threading.Lock()
+
+def parse_args(text, today=None):
+    """Разбирает аргументы /export: [дд.мм.гггг [дд.мм.гггг]] [csv|xlsx].
+
+    Без дат — последние EXPORT_DEFAULT_DAYS дней по сегодня, с одной датой —
+    только этот день. Возвращает (first_day, last_day, формат) с днями
+    'YYYY-MM-DD'; при ошибке бросает ValueError с текстом для пользователя."""
+    today = today or datetime.now(pytz.timezone(EXPORT_TZ)).date()
+    fmt = 'xlsx' if openpyxl is not None else 'csv'
+    days = []
+    for arg in text.split()[1:]:
+        if arg.lower() in FORMATS:
+            fmt = arg.lower()
+            continue
+        try:
+            days.append(datetime.strptime(arg, '%d.%m.%Y').date())
+        except ValueError:
+            raise ValueError(f"Не удалось разобрать «{arg}»: ожидается дата дд.мм.гггг или формат csv/xlsx")
+
+    if len(days) > 2:
+        raise ValueError("Укажите не больше двух дат: начало и конец периода")
+    if not days:
+        days = [today - timedelta(days=EXPORT_DEFAULT_DAYS - 1), today]
+    first_day, last_day = days[0], days[-1]
+    if first_day > last_day:
+        raise ValueError("Дата начала периода позже даты окончания")
+    if (last_day - first_day).days + 1 > EXPORT_MAX_DAYS:
+        raise ValueError(f"Период выгрузки — не больше {EXPORT_MAX_DAYS} дней")
+    if fmt == 'xlsx' and openpyxl is None:
+        raise ValueError("Формат XLSX недоступен (не установлен openpyxl), используйте csv")
+    return first_day.strftime('%Y-%m-%d'), last_day.strftime('%Y-%m-%d'), fmt
+
+def _safe_text(text):
+    # «- пункт списка» формулой не считается, апостроф нужен только перед «-1+2» и т.п.
+    if text and text.startswith(FORMULA_PREFIXES) and not (text[0] == '-' and text[1:2].isspace()):
+        return "'" + text
+    return text
+
+def iter_rows(first_day, last_day):
+    """Строки выгрузки: даты переведены в EXPORT_TZ, текст защищен от формул"""
+    zone = pytz.timezone(EXPORT_TZ)
+    for kind, row_id, user_id, first_name, username, date, text, completed in database.iter_export_rows(
+            first_day, last_day, EXPORT_TZ, EXPORT_BATCH_SIZE):
+        local = datetime.fromisoformat(date).replace(tzinfo=pytz.utc).astimezone(zone)
+        yield [
+            KIND_TITLES[kind],
+            row_id,
+            user_id,
+            _safe_text(first_name or ""),
+            username or "",
+            local.strftime('%d.%m.%Y %H:%M'),
+            _safe_text(text or ""),
+            "" if completed is None else ("да" if completed else "нет"),
+        ]
+
+def write_csv(path, rows):
+    """Пишет строки в CSV, сжатый gzip; возвращает число строк"""
+    count = 0
+    # utf-8-sig: Excel без BOM показывает кириллицу кракозябрами
+    with gzip.open(path, 'wt', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+def write_xlsx(path, rows):
+    """Пишет строки в XLSX в потоковом режиме openpyxl; возвращает число строк"""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Отчеты")
+    sheet.append(COLUMNS)
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+    workbook.save(path)
+    return count
+
+WRITERS = {'csv': (write_csv, '.csv.gz'), 'xlsx': (write_xlsx, '.xlsx')}
+
+def build_export(first_day, last_day, fmt):
+    """Собирает файл выгрузки во временном каталоге; возвращает (путь, число строк)"""
+    writer, suffix = WRITERS[fmt]
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=suffix, dir=EXPORT_DIR)
+    os.close(fd)
+    try:
+        return path, writer(path, iter_rows(first_day, last_day))
+    except BaseException:
+        os.remove(path)
+        raise
+
+def start_export(bot, chat_id, first_day, last_day, fmt):
+    """Ставит выгрузку в очередь пула; False, если в этом чате она уже готовится"""
+    with _active_lock:
+        if chat_id in _active_chats:
+            return False
+        _active_chats.add(chat_id)
+    try:
+        _executor.submit(_run_export, bot, chat_id, first_day, last_day, fmt)
+    except BaseException:
+        with _active_lock:
+            _active_chats.discard(chat_id)
+        raise
+    return True
+
+def _run_export(bot, chat_id, first_day, last_day, fmt):
+    started = time.perf_counter()
+    path = None
+    period = f"{_display(first_day)}–{_display(last_day)}"
+    try:
+        path, count = build_export(first_day, last_day, fmt)
+        metrics.observe('export_seconds', time.perf_counter() - started, format=fmt)
+        if not count:
+            bot.send_message(chat_id, f"📭 За период {period} отчетов нет")
+            return
+        with open(path, 'rb') as document:
+            bot.send_document(
+                chat_id,
+                document,
+                visible_file_name=f"reports_{first_day}_{last_day}{WRITERS[fmt][1]}",
+                caption=f"📊 Отчеты за {period}, строк: {count}"
+            )
+        print(f"Выгрузка {period} ({fmt}) отправлена в чат {chat_id}: {count} строк, "
+              f"{time.perf_counter() - started:.1f} с")
+    except Exception as e:
+        print(f"Ошибка выгрузки {period} для чата {chat_id}: {e}")
+        metrics.inc('errors_total', where='export', type=type(e).__name__)
+        try:
+            bot.send_message(chat_id, "❌ Не удалось подготовить выгрузку")
+        except Exception:
+            pass
+    finally:
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+        with _active_lock:
+            _active_chats.discard(chat_id)
+
+def _display(day):
+    return datetime.strptime(day, '%Y-%m-%d').strftime('%d.%m.%Y')
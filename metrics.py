@@ -0,0 +1,232 @@
+"""Метрики бота: счетчики, гистограммы времени и HTTP-страница в формате Prometheus.
+
+Метрики включаются переменной METRICS_PORT. Без нее install() ничего не
+оборачивает, а inc()/observe() сразу возвращаются, поэтому выключенные
+метрики почти ничего не стоят.
+
+install() оборачивает таймерами обработчики сообщений и кнопок, шаги
+диалогов, публичные функции database и все запросы к Bot API. Счетчики
+событий (сохраненные отчеты, отправленные напоминания, ошибки по типам)
+увеличиваются в местах, где события происходят.
+
+Проверка:
+    METRICS_PORT=9100 python run.py
+    curl http://127.0.0.1:9100/metrics
+"""
+import functools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telebot import apihelper
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 — метрики выключены
+ENABLED = METRICS_PORT > 0
+
+# Границы корзин гистограмм времени, секунды
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'bot_handler_seconds': 'Время обработчиков сообщений, кнопок и шагов диалогов',
+    'db_call_seconds': 'Время функций database',
+    'telegram_api_seconds': 'Время запросов к Bot API',
+    'errors_total': 'Ошибки по месту и типу',
+    'export_seconds': 'Время подготовки файлов выгрузки',
+}
+
+# Служебные функции database, которые не нужно замерять
+DB_SKIP = {'get_db_connection', 'release_connection', 'get_write_connection', 'close_all_connections', 'migrate_db', 'schema_version'}
+
+_lock = threading.Lock()
+_counters = {}    # (имя, метки) -> значение
+_histograms = {}  # (имя, метки) -> [счетчики корзин..., сумма, количество]
+_collectors = []  # функции, возвращающие [(имя, метки, значение)] на момент запроса
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, value=1, **labels):
+    """Увеличивает счетчик name с метками labels"""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, seconds, **labels):
+    """Добавляет значение в гистограмму name с метками labels"""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                series[index] += 1
+                break
+        series[-2] += seconds
+        series[-1] += 1
+
+def timed(name, **labels):
+    """Декоратор: записывает время вызова в гистограмму, а исключения — в errors_total"""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                inc('errors_total', where=func.__name__, type=type(e).__name__)
+                raise
+            finally:
+                observe(name, time.perf_counter() - started, **labels)
+        return wrapper
+    return decorator
+
+def register_collector(collect):
+    """Добавляет функцию, значения которой выводятся как gauge при каждом запросе"""
+    _collectors.append(collect)
+
+# --- Подключение к боту ---
+
+def install(bot, router=None, steps=None):
+    """Оборачивает таймерами обработчики бота, функции database и запросы к Bot API"""
+    if not ENABLED:
+        return
+    import database
+    import retention
+    import transport
+
+    for handlers in (bot.message_handlers, bot.callback_query_handlers):
+        for handler in handlers:
+            function = handler['function']
+            handler['function'] = timed('bot_handler_seconds', handler=function.__name__)(function)
+    if router is not None:
+        for key, (function, parse_args) in list(router.routes.items()):
+            router.routes[key] = (timed('bot_handler_seconds', handler=function.__name__)(function), parse_args)
+    if steps is not None:
+        for state, function in list(steps.items()):
+            steps[state] = timed('bot_handler_seconds', handler=function.__name__)(function)
+
+    for name, function in list(vars(database).items()):
+        if (callable(function) and not name.startswith('_') and name not in DB_SKIP
+                and getattr(function, '__module__', None) == 'database'):
+            setattr(database, name, timed('db_call_seconds', function=name)(function))
+
+    make_request = apihelper._make_request
+
+    def timed_request(token, method_name, method='get', params=None, files=None):
+        started = time.perf_counter()
+        try:
+            return make_request(token, method_name, method, params, files)
+        except apihelper.ApiTelegramException as e:
+            inc('errors_total', where=method_name, type=f"api_{e.error_code}")
+            raise
+        except Exception as e:
+            inc('errors_total', where=method_name, type=type(e).__name__)
+            raise
+        finally:
+            observe('telegram_api_seconds', time.perf_counter() - started, method=method_name)
+    apihelper._make_request = timed_request
+
+    register_collector(lambda: [
+        (f'cache_{stat}', {'cache': name}, value)
+        for name, stats in database.cache_stats().items() for stat, value in stats.items()
+    ])
+    register_collector(lambda: [
+        (f'telegram_http_{stat}', {'method': method}, value)
+        for method, stats in transport.stats().items() for stat, value in stats.items()
+    ])
+    register_collector(lambda: [
+        ('retention_purged_rows', {'table': table}, count)
+        for table, count in retention.last_run.get('purged', {}).items()
+    ] + ([('retention_duration_seconds', {}, retention.last_run['duration'])] if retention.last_run else []))
+
+# --- Вывод ---
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+def render():
+    """Возвращает все метрики в текстовом формате Prometheus"""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, list(series)) for key, series in _histograms.items())
+
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            seen.add(name)
+            if name in HELP:
+                lines.append(f'# HELP {name} {HELP[name]}')
+            lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name}{_format_labels(labels)} {value}')
+
+    for (name, labels), series in histograms:
+        if name not in seen:
+            seen.add(name)
+            if name in HELP:
+                lines.append(f'# HELP {name} {HELP[name]}')
+            lines.append(f'# TYPE {name} histogram')
+        cumulative = 0
+        for bound, count in zip(BUCKETS, series):
+            cumulative += count
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {cumulative}')
+        lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {series[-1]}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {series[-2]:.6f}')
+        lines.append(f'{name}_count{_format_labels(labels)} {series[-1]}')
+
+    samples = []
+    for collect in _collectors:
+        try:
+            samples.extend(collect())
+        except Exception as e:
+            print(f"Ошибка сбора метрик: {e}")
+    # Строки одной метрики должны идти подряд
+    samples.sort(key=lambda sample: sample[0])
+    for name, labels, value in samples:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f'# TYPE {name} gauge')
+        lines.append(f'{name}{_format_labels(tuple(sorted(labels.items())))} {value}')
+    return '\n'.join(lines) + '\n'
+
+def start_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Запускает HTTP-сервер метрик в фоновом потоке; None — если метрики выключены"""
+    if not ENABLED:
+        return None
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            data = render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Метрики доступны на http://{host}:{port}/metrics")
+    return server
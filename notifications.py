@@ -0,0 +1,142 @@
+"""Фоновая очередь уведомлений администраторов о новых отчетах.
+
+save_report только кладет отчет в очередь, а отправкой занимается фоновый поток.
+Отчеты, пришедшие в пределах ADMIN_DIGEST_WINDOW секунд, склеиваются
+в один дайджест. Очередь ограничена: при переполнении уведомление
+отбрасывается и учитывается в счетчике dropped.
+"""
+import os
+import queue
+import threading
+import time
+import broadcast
+import database
+
+ADMIN_DIGEST_WINDOW = float(os.getenv("ADMIN_DIGEST_WINDOW", "3"))  # Секунд ожидания перед отправкой дайджеста
+ADMIN_DIGEST_MAX = int(os.getenv("ADMIN_DIGEST_MAX", "10"))  # Отчетов в одном дайджесте
+ADMIN_QUEUE_SIZE = int(os.getenv("ADMIN_QUEUE_SIZE", "500"))
+
+MESSAGE_LIMIT = 4096  # Ограничение Telegram на длину сообщения
+
+class AdminNotifier:
+    """Очередь уведомлений с фоновым потоком, запускаемым при первом уведомлении"""
+
+    def __init__(self, bot, admin_ids, window=ADMIN_DIGEST_WINDOW,
+                 max_batch=ADMIN_DIGEST_MAX, queue_size=ADMIN_QUEUE_SIZE):
+        self.bot = bot
+        self.admin_ids = admin_ids
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+    def notify(self, user_id, report_text):
+        """Ставит уведомление о новом отчете в очередь; False — если очередь переполнена"""
+        self._ensure_started()
+        try:
+            self.queue.put_nowait((user_id, report_text))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print(f"Очередь уведомлений админов переполнена, отброшено: {self.dropped}")
+            return False
+
+    def stop(self, timeout=None):
+        """Отправляет накопленное и останавливает фоновый поток.
+
+        Ожидание очереди и потока — вне self.lock и не дольше timeout в сумме:
+        при заполненной очереди остановка не зависает и не блокирует notify()."""
+        with self.lock:
+            thread = self.thread
+        if thread is None:
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            # Метка остановки встает после накопленных уведомлений — они будут отправлены
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            print(f"Очередь уведомлений админов не освободилась за {timeout} с, "
+                  f"не отправлено: {self.queue.qsize()}")
+            return
+        thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        if thread.is_alive():
+            print("Уведомления админов не успели отправиться до остановки")
+            return
+        with self.lock:
+            if self.thread is thread:
+                self.thread = None
+
+    def _ensure_started(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="admin-notifier", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._send(batch)
+            except Exception as e:
+                print(f"Ошибка отправки уведомлений админам: {e}")
+            if stopping:
+                return
+
+    def _send(self, batch):
+        texts = format_digest([(self._user_name(user_id), text) for user_id, text in batch])
+        broadcast.broadcast(
+            self.bot,
+            [(admin_id, text) for admin_id in self.admin_ids for text in texts],
+            workers=max(1, min(len(self.admin_ids), broadcast.BROADCAST_WORKERS)),
+            name="Уведомление админов"
+        )
+
+    @staticmethod
+    def _user_name(user_id):
+        user = database.get_user(user_id)
+        return user[1] if user and user[1] else f"User {user_id}"
+
+def format_digest(reports):
+    """Собирает сообщения-уведомления из списка (имя, текст отчета).
+
+    Один отчет — прежнее уведомление, несколько — дайджест, разбитый
+    на сообщения не длиннее лимита Telegram."""
+    if len(reports) == 1:
+        user_name, text = reports[0]
+        return [_truncate(f"📩 Новый отчет от {user_name}:\n\n{text}")]
+
+    header = f"📩 Новые отчеты ({len(reports)}):"
+    messages = []
+    current = header
+    for user_name, text in reports:
+        entry = _truncate(f"👤 {user_name}:\n{text}", MESSAGE_LIMIT - len(header) - 2)
+        if len(current) + 2 + len(entry) > MESSAGE_LIMIT:
+            messages.append(current)
+            current = header
+        current += "\n\n" + entry
+    messages.append(current)
+    return messages
+
+def _truncate(text, limit=MESSAGE_LIMIT):
+    return text if len(text) <= limit else text[:limit - 1] + "…"
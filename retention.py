@@ -0,0 +1,79 @@
+"""Хранение отчетов: удаление (или перенос в архив) устаревших строк.
+
+Сроки хранения задаются отдельно для каждой таблицы в днях; 0 отключает очистку
+таблицы. Строки удаляются пачками по RETENTION_BATCH_SIZE в отдельных коротких
+транзакциях с паузой между ними, чтобы обработчики бота не ждали блокировку
+записи. После удаления освободившиеся страницы возвращаются через
+incremental_vacuum (режим auto_vacuum=INCREMENTAL включает migrate_db).
+"""
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+import conversation
+import database
+
+RETENTION_DAYS = {
+    # таблица: (колонка даты, срок хранения в днях)
+    'reports': ('report_date', int(os.getenv("RETENTION_REPORTS_DAYS", "7"))),
+    'tasks': ('task_date', int(os.getenv("RETENTION_TASKS_DAYS", "7"))),
+    'report_history': ('edited_at', int(os.getenv("RETENTION_HISTORY_DAYS", "7"))),
+    'reminder_deliveries': ('sent_at', int(os.getenv("RETENTION_DELIVERIES_DAYS", "7"))),
+}
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+RETENTION_BATCH_PAUSE = float(os.getenv("RETENTION_BATCH_PAUSE", "0.05"))  # Секунд между пачками
+RETENTION_VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "1000"))  # Страниц за один шаг очистки
+RETENTION_ARCHIVE_DB = os.getenv("RETENTION_ARCHIVE_DB")  # Файл архива; если не задан — строки удаляются
+RETENTION_TIME = os.getenv("RETENTION_TIME", "03:00")  # Время ежедневного запуска по МСК
+
+# Итоги последнего запуска
+last_run = {}
+
+def run_retention(now=None):
+    """Удаляет устаревшие строки всех таблиц и возвращает метрики запуска"""
+    started = time.monotonic()
+    now = now or datetime.utcnow()
+    stats = {'purged': {}, 'vacuumed_pages': 0, 'duration': 0.0}
+    archive_conn = sqlite3.connect(RETENTION_ARCHIVE_DB) if RETENTION_ARCHIVE_DB else None
+
+    try:
+        for table, (date_column, days) in RETENTION_DAYS.items():
+            if days <= 0:
+                continue
+            cutoff = (now - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+            purged = 0
+            while True:
+                count = database.purge_rows_before(
+                    table, date_column, cutoff, RETENTION_BATCH_SIZE, archive_conn)
+                purged += count
+                if count < RETENTION_BATCH_SIZE:
+                    break
+                time.sleep(RETENTION_BATCH_PAUSE)
+            stats['purged'][table] = purged
+
+        # Брошенные диалоги (нажали «Начать Факт-отчет» и не ответили)
+        stats['purged']['conversation_state'] = database.purge_conversation_states(
+            time.time() - conversation.CONVERSATION_TTL)
+
+        # Возвращаем освободившиеся страницы небольшими шагами
+        if any(stats['purged'].values()):
+            while True:
+                freed, remaining = database.incremental_vacuum(RETENTION_VACUUM_PAGES)
+                stats['vacuumed_pages'] += freed
+                if not freed or not remaining:
+                    break
+                time.sleep(RETENTION_BATCH_PAUSE)
+    except Exception as e:
+        print(f"Ошибка очистки устаревших данных: {e}")
+        stats['error'] = str(e)
+    finally:
+        if archive_conn is not None:
+            archive_conn.close()
+
+    stats['duration'] = time.monotonic() - started
+    last_run.clear()
+    last_run.update(stats)
+    purged = ", ".join(f"{table}: {count}" for table, count in stats['purged'].items())
+    print(f"Очистка устаревших данных: {purged}; освобождено страниц {stats['vacuumed_pages']}, "
+          f"за {stats['duration']:.1f} с")
+    return stats
@@ -1,21 +1,59 @@
-import threading
-from bot import bot, reminder_scheduler
+import os
+from bot import CONVERSATION_STEPS, admin_notifier, bot, create_scheduler, router
+import config
 import database
+import metrics
+import transport
+import webhook
+import workers
 import time
 
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
 def run_bot():
     print("Бот запущен")
     bot.polling(none_stop=True)
 
-if __name__ == "__main__":
-    # Инициализация базы данных
-    database.init_db()
+def bootstrap():
+    """Подготовка к приему обновлений: схема базы, пул соединений, метрики, планировщик.
+
+    Импорт модулей ничего не создает в базе и не запускает потоков — все это
+    делается здесь один раз. Возвращает запущенный планировщик."""
+    if not config.BOT_TOKEN:
+        raise SystemExit("Не задан BOT_TOKEN")
+    if not config.ADMIN_IDS:
+        print("Внимание: ADMIN_IDS пуст, административные команды недоступны")
+
+    # Схема базы: при актуальной версии — один запрос к schema_version
     database.migrate_db()
-    
-    # Запускаем планировщик напоминаний
-    reminder_thread = threading.Thread(target=reminder_scheduler, daemon=True)
-    reminder_thread.start()
-    print("Планировщик напоминаний запущен")
-    
+
+    # Общий пул соединений к Bot API для всех потоков процесса
+    transport.install()
+
+    # Метрики (если задан METRICS_PORT)
+    metrics.install(bot, router, CONVERSATION_STEPS)
+    metrics.start_server()
+
+    # Запускаем планировщик напоминаний и очистки
+    jobs = create_scheduler()
+    jobs.start()
+    return jobs
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    jobs = bootstrap()
+    print(f"Подготовка к запуску заняла {(time.perf_counter() - started) * 1000:.0f} мс")
+
     # Запускаем бота в основном потоке
-    run_bot()
+    try:
+        if workers.BOT_WORKERS > 0:
+            workers.run_multiprocess(bot, BOT_MODE)
+        elif BOT_MODE == "webhook":
+            webhook.run_webhook(bot)
+        else:
+            run_bot()
+    finally:
+        # Дожидаемся начатой рассылки или очистки и отправляем накопленные уведомления админам
+        jobs.stop(timeout=60)
+        admin_notifier.stop(timeout=30)
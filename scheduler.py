@@ -0,0 +1,157 @@
+"""Планировщик периодических задач на куче таймеров.
+
+Поток планировщика спит ровно до ближайшего запуска (или до добавления
+задачи/остановки), а не просыпается раз в минуту. Задача описывается
+временем суток в своем часовом поясе и днями недели. Каждая задача
+выполняется в отдельном потоке, поэтому долгая очистка не задерживает
+напоминания; соединение с базой этого потока закрывается после задачи.
+
+Время последнего запуска каждой задачи хранится в таблице scheduler_runs.
+Если бот был остановлен в момент запуска, после старта задача выполняется
+сразу, но только пока с пропущенного времени прошло не больше catch_up секунд.
+"""
+import heapq
+import itertools
+import os
+import threading
+from datetime import datetime, timedelta
+import pytz
+import database
+
+SCHEDULER_TZ = os.getenv("SCHEDULER_TZ", "Europe/Moscow")
+SCHEDULER_MAX_SLEEP = 3600  # Секунд; перепроверка на случай перевода системных часов
+
+WORKDAYS = (0, 1, 2, 3, 4)  # Понедельник — пятница
+EVERY_DAY = tuple(range(7))
+
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+class Job:
+    """Ежедневная задача: время 'HH:MM' в поясе tz по дням недели weekdays"""
+
+    def __init__(self, name, at, func, args=(), weekdays=EVERY_DAY, tz=SCHEDULER_TZ, catch_up=None):
+        self.name = name
+        self.at = datetime.strptime(at, '%H:%M').time()
+        self.func = func
+        self.args = args
+        self.weekdays = frozenset(weekdays)
+        self.tz = pytz.timezone(tz)
+        self.catch_up = catch_up
+        self.thread = None
+
+    def next_run(self, after):
+        """Ближайший запуск строго позже after (datetime с поясом)"""
+        day = after.astimezone(self.tz).date()
+        for _ in range(8):
+            if day.weekday() in self.weekdays:
+                run_at = self.tz.localize(datetime.combine(day, self.at))
+                if run_at > after:
+                    return run_at
+            day += timedelta(days=1)
+        raise ValueError(f"У задачи {self.name} нет дней запуска")
+
+    def previous_run(self, before):
+        """Последний запуск не позже before"""
+        day = before.astimezone(self.tz).date()
+        for _ in range(8):
+            if day.weekday() in self.weekdays:
+                run_at = self.tz.localize(datetime.combine(day, self.at))
+                if run_at <= before:
+                    return run_at
+            day -= timedelta(days=1)
+        return None
+
+class Scheduler:
+    """Куча (время запуска, порядковый номер, задача) и поток, который ее разбирает"""
+
+    def __init__(self):
+        self.heap = []
+        self.jobs = {}
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.thread = None
+
+    def every_day(self, name, at, func, *args, weekdays=EVERY_DAY, tz=SCHEDULER_TZ, catch_up=None):
+        """Добавляет задачу func(*args) на время at ('HH:MM') в поясе tz"""
+        job = Job(name, at, func, args, weekdays, tz, catch_up)
+        with self.condition:
+            if name in self.jobs:
+                raise ValueError(f"Задача {name} уже добавлена")
+            self.jobs[name] = job
+            if self.thread is not None:
+                self._push(job, job.next_run(_now()))
+                self.condition.notify()
+        return job
+
+    def start(self):
+        """Выполняет пропущенные запуски и запускает поток планировщика"""
+        now = _now()
+        last_runs = database.get_scheduler_runs()
+        with self.condition:
+            self.stopping = False
+            for job in self.jobs.values():
+                missed = job.previous_run(now)
+                last_run = last_runs.get(job.name)
+                if (missed is not None and job.catch_up is not None
+                        and (last_run is None or last_run < _utc_text(missed))
+                        and (now - missed).total_seconds() <= job.catch_up):
+                    print(f"Задача {job.name}: пропущен запуск {missed:%d.%m %H:%M}, выполняем сейчас")
+                    self._push(job, missed)
+                else:
+                    self._push(job, job.next_run(now))
+            self.thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self.thread.start()
+        print(f"Планировщик запущен, задач: {len(self.jobs)}")
+
+    def stop(self, timeout=None):
+        """Останавливает планировщик и ждет завершения выполняющихся задач"""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        for job in self.jobs.values():
+            if job.thread is not None:
+                job.thread.join(timeout)
+
+    def _push(self, job, run_at):
+        heapq.heappush(self.heap, (run_at, next(self.counter), job))
+
+    def _loop(self):
+        while True:
+            with self.condition:
+                while not self.stopping:
+                    delay = (self.heap[0][0] - _now()).total_seconds() if self.heap else SCHEDULER_MAX_SLEEP
+                    if delay <= 0:
+                        break
+                    self.condition.wait(min(delay, SCHEDULER_MAX_SLEEP))
+                if self.stopping:
+                    return
+                run_at, _, job = heapq.heappop(self.heap)
+                self._push(job, job.next_run(max(run_at, _now())))
+            self._run(job, run_at)
+
+    def _run(self, job, run_at):
+        if job.thread is not None and job.thread.is_alive():
+            print(f"Задача {job.name} еще выполняется, запуск {run_at:%d.%m %H:%M} пропущен")
+            return
+        # Запуск отмечается до выполнения: падение задачи не приведет к повтору после перезапуска
+        database.set_scheduler_run(job.name, _utc_text(run_at))
+        job.thread = threading.Thread(target=self._execute, args=(job,), name=f"job-{job.name}", daemon=True)
+        job.thread.start()
+
+    def _execute(self, job):
+        try:
+            job.func(*job.args)
+        except Exception as e:
+            print(f"Ошибка задачи {job.name}: {e}")
+        finally:
+            # Поток задачи одноразовый: его соединение больше не понадобится
+            database.release_connection()
+
+def _now():
+    return datetime.now(pytz.utc)
+
+def _utc_text(moment):
+    return moment.astimezone(pytz.utc).strftime(_TIME_FORMAT)
@@ -0,0 +1,116 @@
+"""Исходящие запросы к Bot API через общий пул соединений процесса.
+
+По умолчанию telebot держит отдельную requests.Session в каждом потоке и
+пересоздает ее раз в 10 минут. Рассылка запускает новый пул потоков на каждый
+прогон, поэтому каждая рассылка открывает новые соединения и заново проходит
+TLS-рукопожатия с api.telegram.org, а соединения прежних потоков висят до сборки мусора.
+
+install() подменяет отправку запроса (apihelper.CUSTOM_REQUEST_SENDER): все
+потоки процесса берут соединения keep-alive из одного HTTPAdapter на
+API_POOL_SIZE соединений. Размер пула должен быть не меньше числа потоков,
+одновременно обращающихся к API (рассылка, обработчики, выгрузка), иначе
+лишние соединения закрываются после запроса. Таймауты задаются через
+API_CONNECT_TIMEOUT и API_READ_TIMEOUT (getUpdates удлиняет чтение сам).
+
+Методы Bot API не идемпотентны: повтор sendMessage после ответа сервера
+пришлет сообщение дважды. Поэтому повторяются только ошибки установки
+соединения, когда запрос до сервера не дошел; ответ 429 обрабатывает
+broadcast по retry_after.
+
+stats() — число запросов, ошибки, повторы и время по методам Bot API за
+последние API_STATS_WINDOW запросов каждого метода; metrics выводит их как gauge.
+"""
+import os
+import threading
+import time
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+from urllib3.util.retry import Retry
+
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "32"))  # Соединений в пуле; 0 — сессии telebot по умолчанию
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "30"))
+API_RETRIES = int(os.getenv("API_RETRIES", "3"))  # Повторов при ошибке соединения
+API_RETRY_BACKOFF = float(os.getenv("API_RETRY_BACKOFF", "0.3"))  # Паузы перед повторами: 0, 0.6, 1.2 с...
+API_STATS_WINDOW = int(os.getenv("API_STATS_WINDOW", "1000"))  # Замеров на метод для перцентилей
+
+_session = None
+_stats_lock = threading.Lock()
+_stats = {}  # метод Bot API -> [запросы, ошибки, повторы, deque времен]
+
+def create_session(pool_size=API_POOL_SIZE, retries=API_RETRIES, backoff=API_RETRY_BACKOFF):
+    """Сессия requests с общим пулом соединений и повтором ошибок соединения"""
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=0,
+        other=0,
+        allowed_methods=None,  # POST тоже: повторяется только неотправленный запрос
+        backoff_factor=backoff,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def install():
+    """Направляет запросы telebot этого процесса через общий пул соединений"""
+    global _session
+    if API_POOL_SIZE <= 0:
+        return
+    if _session is None:
+        _session = create_session()
+    apihelper.CONNECT_TIMEOUT = API_CONNECT_TIMEOUT
+    apihelper.READ_TIMEOUT = API_READ_TIMEOUT
+    apihelper.CUSTOM_REQUEST_SENDER = send
+
+def send(method, url, params=None, files=None, timeout=None, proxies=None):
+    """Отправляет запрос telebot через общую сессию и записывает время по методу"""
+    name = url.rsplit('/', 1)[-1]
+    started = time.perf_counter()
+    try:
+        response = _session.request(method, url, params=params, files=files, timeout=timeout, proxies=proxies)
+    except Exception:
+        _record(name, time.perf_counter() - started, error=True)
+        raise
+    retries = getattr(response.raw, 'retries', None)
+    _record(name, time.perf_counter() - started, error=response.status_code >= 500,
+            retries=len(retries.history) if retries is not None else 0)
+    return response
+
+def _record(name, seconds, error=False, retries=0):
+    with _stats_lock:
+        series = _stats.get(name)
+        if series is None:
+            series = _stats[name] = [0, 0, 0, deque(maxlen=API_STATS_WINDOW)]
+        series[0] += 1
+        series[1] += error
+        series[2] += retries
+        series[3].append(seconds)
+
+def stats():
+    """Запросы по методам Bot API: requests, errors, retries и p50/p95/max в секундах"""
+    with _stats_lock:
+        snapshot = {name: (count, errors, retries, list(samples))
+                    for name, (count, errors, retries, samples) in _stats.items()}
+    result = {}
+    for name, (count, errors, retries, samples) in snapshot.items():
+        samples.sort()
+        result[name] = {
+            'requests': count,
+            'errors': errors,
+            'retries': retries,
+            'p50_seconds': samples[len(samples) // 2] if samples else 0.0,
+            'p95_seconds': samples[int(len(samples) * 0.95)] if samples else 0.0,
+            'max_seconds': samples[-1] if samples else 0.0,
+        }
+    return result
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,134 @@
+"""Режим webhook: локальный HTTP-сервер вместо bot.polling.
+
+Сервер только принимает обновления и кладет их в ограниченные очереди,
+а обработчики выполняет пул потоков UpdateDispatcher. Обновления одного
+чата всегда попадают в одну очередь, поэтому шаги диалогов
+обрабатываются по порядку. Если очередь переполнена, сервер отвечает 503,
+и Telegram повторит доставку позже.
+
+Telegram требует HTTPS, поэтому снаружи сервер ставится за обратный прокси.
+Локальная проверка записанным обновлением:
+    BOT_MODE=webhook python run.py
+    curl -X POST -H 'Content-Type: application/json' -d @update.json http://127.0.0.1:8443/webhook
+"""
+import json
+import os
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telebot import types
+
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Публичный адрес для setWebhook; без него регистрация пропускается
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+
+def chat_id_of(update):
+    """Возвращает id чата (или пользователя), к которому относится обновление"""
+    for key in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        if key in update:
+            return update[key]['chat']['id']
+    for value in update.values():
+        if isinstance(value, dict) and 'from' in value:
+            return value['from']['id']
+    return 0
+
+class UpdateDispatcher:
+    """Пул потоков-обработчиков с отдельной ограниченной очередью на каждый поток"""
+
+    def __init__(self, bot, workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE):
+        self.bot = bot
+        self.queues = [queue.Queue(maxsize=max(1, queue_size // workers)) for _ in range(workers)]
+        self.threads = []
+
+    def start(self):
+        for index, q in enumerate(self.queues):
+            thread = threading.Thread(target=self._worker, args=(q,), name=f"update-worker-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, update, block=False, timeout=None):
+        """Ставит обновление (dict из JSON) в очередь; False — если очередь переполнена"""
+        q = self.queues[chat_id_of(update) % len(self.queues)]
+        try:
+            q.put(update, block, timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def stop(self):
+        for q in self.queues:
+            q.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def _worker(self, q):
+        while True:
+            update = q.get()
+            if update is None:
+                break
+            try:
+                self.bot.process_new_updates([types.Update.de_json(update)])
+            except Exception as e:
+                print(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+
+def make_server(dispatcher, host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+    """Создает HTTP-сервер, принимающий обновления на path и передающий их в dispatcher"""
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != path:
+                self._reply(404)
+                return
+            if secret and self.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret:
+                self._reply(403)
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                update = json.loads(self.rfile.read(length))
+            except ValueError:
+                self._reply(400)
+                return
+            # Обновление Telegram — всегда объект; массив или строку не разбираем
+            if not isinstance(update, dict):
+                self._reply(400)
+                return
+            self._reply(200 if dispatcher.submit(update) else 503)
+
+        def _reply(self, status):
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), WebhookHandler)
+    server.daemon_threads = True
+    return server
+
+def run_webhook(bot, dispatcher=None):
+    """Запускает бота в режиме webhook (блокирует текущий поток).
+
+    dispatcher — куда передавать обновления; по умолчанию пул потоков этого процесса"""
+    if dispatcher is None:
+        # Обработчики выполняются в пуле UpdateDispatcher, а не во внутреннем пуле telebot
+        bot.threaded = False
+        dispatcher = UpdateDispatcher(bot)
+    dispatcher.start()
+
+    if WEBHOOK_URL:
+        bot.remove_webhook()
+        bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+
+    server = make_server(dispatcher)
+    print(f"Webhook-сервер слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        dispatcher.stop()
@@ -0,0 +1,125 @@
+"""Многопроцессный режим: один процесс принимает обновления, N процессов их обрабатывают.
+
+Процесс-приемщик получает обновления через polling (getUpdates) или webhook
+и раскладывает их по очередям рабочих процессов по chat_id. Поэтому все
+сообщения одного чата обрабатывает один процесс в порядке поступления, и
+шаги диалогов не перемешиваются. Внутри процесса обновления разбирает пул
+потоков webhook.UpdateDispatcher с тем же разбиением по чатам.
+Планировщик напоминаний запускается только в процессе-приемщике (run.py).
+
+Проверка на одной машине с локальной заглушкой Bot API:
+    python benchmarks/fake_bot_api.py --port 8081
+    TELEGRAM_API_URL=http://127.0.0.1:8081/bot{0}/{1} BOT_WORKERS=4 python run.py
+"""
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from telebot import apihelper
+import metrics
+import transport
+import webhook
+
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "0"))  # Число рабочих процессов; 0 — все в одном процессе
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "2"))  # Потоков-обработчиков в каждом процессе
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))  # Очередь одного процесса
+POLLING_TIMEOUT = int(os.getenv("POLLING_TIMEOUT", "20"))  # Секунд long polling getUpdates
+
+def _worker_main(updates, index):
+    """Точка входа рабочего процесса: обрабатывает обновления из своей очереди"""
+    from bot import CONVERSATION_STEPS, admin_notifier, bot, router
+
+    bot.threaded = False
+    # spawn: пул соединений к Bot API у каждого процесса свой
+    transport.install()
+    # У каждого процесса свои метрики на следующем порту после приемщика
+    metrics.install(bot, router, CONVERSATION_STEPS)
+    metrics.start_server(port=metrics.METRICS_PORT + 1 + index)
+    dispatcher = webhook.UpdateDispatcher(bot, WORKER_THREADS, WORKER_QUEUE_SIZE)
+    dispatcher.start()
+    parent = multiprocessing.parent_process()
+    while True:
+        try:
+            update = updates.get(timeout=1)
+        except queue.Empty:
+            # Приемщик убит сигналом и не успел остановить рабочих — выходим сами
+            if not parent.is_alive():
+                break
+            continue
+        if update is None:
+            break
+        dispatcher.submit(update, block=True)
+    dispatcher.stop()
+    admin_notifier.stop()
+
+class ProcessDispatcher:
+    """Раздает обновления рабочим процессам по chat_id; интерфейс как у UpdateDispatcher"""
+
+    def __init__(self, processes=BOT_WORKERS, queue_size=WORKER_QUEUE_SIZE):
+        # spawn: рабочие процессы не наследуют открытые соединения SQLite и потоки
+        self.context = multiprocessing.get_context('spawn')
+        self.queues = [self.context.Queue(maxsize=queue_size) for _ in range(processes)]
+        self.processes = [None] * processes
+        self.lock = threading.Lock()
+
+    def start(self):
+        for index in range(len(self.queues)):
+            self._start_process(index)
+
+    def submit(self, update, block=False, timeout=None):
+        """Передает обновление процессу его чата; False — если очередь переполнена"""
+        index = webhook.chat_id_of(update) % len(self.queues)
+        if not self.processes[index].is_alive():
+            with self.lock:
+                if not self.processes[index].is_alive():
+                    print(f"Рабочий процесс {index} завершился (код {self.processes[index].exitcode}), перезапуск")
+                    self._start_process(index)
+        try:
+            self.queues[index].put(update, block, timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def stop(self):
+        for q in self.queues:
+            q.put(None)
+        for process in self.processes:
+            process.join()
+
+    def _start_process(self, index):
+        process = self.context.Process(
+            target=_worker_main, args=(self.queues[index], index), name=f"bot-worker-{index}", daemon=True)
+        process.start()
+        self.processes[index] = process
+
+def poll_updates(token, dispatcher):
+    """Получает обновления через getUpdates и передает их dispatcher (блокирует поток)"""
+    offset = None
+    while True:
+        try:
+            updates = apihelper.get_updates(token, offset=offset, timeout=POLLING_TIMEOUT,
+                                            long_polling_timeout=POLLING_TIMEOUT)
+        except Exception as e:
+            print(f"Ошибка getUpdates: {e}")
+            time.sleep(3)
+            continue
+        for update in updates:
+            # Ждем место в очереди: при polling отказ означал бы потерю обновления
+            dispatcher.submit(update, block=True)
+            offset = update['update_id'] + 1
+
+def run_multiprocess(bot, mode="polling"):
+    """Запускает процесс-приемщик с BOT_WORKERS рабочими процессами (блокирует поток)"""
+    dispatcher = ProcessDispatcher()
+    print(f"Запуск {len(dispatcher.queues)} рабочих процессов, прием обновлений: {mode}")
+    if mode == "webhook":
+        webhook.run_webhook(bot, dispatcher)
+        return
+
+    dispatcher.start()
+    bot.remove_webhook()
+    try:
+        poll_updates(bot.token, dispatcher)
+    finally:
+        dispatcher.stop()